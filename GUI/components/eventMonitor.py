@@ -0,0 +1,121 @@
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+import numpy as np
+import time
+import sys
+import os
+sys.path.append("../")
+sys.path.append(os.getcwd())
+from sonicwalk.sharedVariables import SharedEventLog
+
+
+class EventMonitor(QObject):
+    """
+    Follows the event logs published live by the analyzers and delivers them to the Qt main thread.
+    The logs are polled by a timer: all the events published since the last poll are delivered
+    with a single notification (nothing is emitted if there are no new events).
+    """
+    eventsReceived = pyqtSignal(object)     # structured numpy.array with the new events (see sharedVariables.EVENT_DTYPE)
+    statsUpdated = pyqtSignal(int, float)   # number of steps, rolling cadence (steps per minute)
+
+    def __init__(self, shared_data, interval=100, cadenceWindow=10.0, markersLength=64):
+        """
+        Requires:
+            - shared_data (SharedData): shared data of the recordings, holding an event log for each sensor
+            - interval (int): polling period in milliseconds (default: 100)
+            - cadenceWindow (float): seconds of steps used to estimate the cadence (default: 10)
+            - markersLength (int): number of the newest step events kept for each sensor (default: 64)
+
+        Modifies:
+            - self
+
+        Effects:
+            - Initializes the monitor (stopped).
+        """
+        super().__init__()
+        self.shared_data = shared_data
+        self.cadenceWindow = cadenceWindow
+        self.markersLength = markersLength
+        self.timer = QTimer(self)
+        self.timer.setInterval(interval)
+        self.timer.timeout.connect(self.poll)
+        self.reset()
+
+    def reset(self):
+        """
+        MODIFIES:
+            - self
+
+        EFFECTS:
+            - Forgets the events received (to be called when a new recording starts).
+        """
+        self.cursors = [0] * len(self.shared_data.events)
+        self.steps = 0
+        self.stepTimes = np.zeros(0, dtype=np.float64)
+        self.lastCadence = 0.0
+        self.markers = [np.zeros(0, dtype=np.int64) for _ in self.shared_data.events]
+
+    def start(self):
+        """
+        EFFECTS:
+            - Starts following the event logs from the first event.
+        """
+        self.reset()
+        self.timer.start()
+
+    def stop(self):
+        """
+        EFFECTS:
+            - Stops following the event logs, the events published until now are delivered.
+        """
+        self.timer.stop()
+        self.poll()
+
+    def poll(self):
+        """
+        MODIFIES:
+            - self
+
+        EFFECTS:
+            - Reads the events published since the last poll, updates step count, cadence and markers
+              and emits eventsReceived and statsUpdated once if there are new events
+              (statsUpdated is also emitted when the cadence drops to 0 because the steps stopped).
+        """
+        batches = []
+        for i, log in enumerate(self.shared_data.events):
+            new = log.read(self.cursors[i])
+            if new.size == 0: continue
+            self.cursors[i] += new.size
+            batches.append(new)
+            steps = new[new["eventType"] == SharedEventLog.MOVEMENT]
+            self.markers[i] = np.concatenate((self.markers[i], steps["sampleIndex"]))[-self.markersLength:]
+            self.steps += steps.size
+            self.stepTimes = np.concatenate((self.stepTimes, steps["wallTime"]))
+        if not batches:
+            if self.lastCadence > 0 and self.cadence() == 0:
+                self.lastCadence = 0.0
+                self.statsUpdated.emit(self.steps, self.lastCadence)
+            return
+
+        self.stepTimes = np.sort(self.stepTimes)
+        if self.stepTimes.size > 0: self.stepTimes = self.stepTimes[self.stepTimes >= self.stepTimes[-1] - self.cadenceWindow]
+        self.lastCadence = self.cadence()
+        self.eventsReceived.emit(np.concatenate(batches))
+        self.statsUpdated.emit(self.steps, self.lastCadence)
+
+    def cadence(self):
+        """
+        EFFECTS:
+            - Returns the rolling cadence in steps per minute, estimated on the steps of the last cadenceWindow seconds
+              (0 if there are less than two of them or the last one is older than cadenceWindow seconds).
+        """
+        if self.stepTimes.size < 2 or time.time() - self.stepTimes[-1] > self.cadenceWindow: return 0.0
+        elapsed = self.stepTimes[-1] - self.stepTimes[0]
+        return float(60.0 * (self.stepTimes.size - 1) / elapsed) if elapsed > 0 else 0.0
+
+    def stepMarkers(self, sensor, first, end):
+        """
+        EFFECTS:
+            - Returns the global indices of the step events of sensor in [first, end) (e.g. the samples shown by the live plot).
+        """
+        markers = self.markers[sensor]
+        return markers[(markers >= first) & (markers < end)]
@@ -138,7 +138,14 @@ class RecordingFrame(QWidget):
         self.time_label.setContentsMargins(25, 25, 25, 25)
         self.layout_actions.addWidget(self.time_label)
 
+        # Create live steps label (updated by the step events of the analyzers during the recording)
+        self.live_stats_label = QLabel()
+        self.live_stats_label.setProperty("class", "")
+        self.live_stats_label.setAlignment(Qt.AlignCenter)
+        self.setLiveStats(0, 0.0)
+
         # add all to the class frame
+        self.layout_actions.addWidget(self.live_stats_label)
         self.layout_actions.addWidget(self.buttons_actions_frame)
         self.layout_actions.addWidget(self.time_label)
         self.layout_actions.setContentsMargins(25, 25, 25, 25)
@@ -152,9 +159,27 @@ class RecordingFrame(QWidget):
 
         EFFECTS:
             - on close event, if the recording thread is running, stops the recording safely 
+            - otherwise releases the MTW devices kept connected between the recordings
         """
         if self.record_thread is not None and self.record_thread.is_alive():
             self.record_thread.interrupt_recording(lambda: self.setSaved(None))
+        elif self.record_thread is not None:
+            self.record_thread.clean()
+
+    def setLiveStats(self, steps, cadence):
+        """
+        REQUIRES:
+            - steps (int): number of steps detected since the start of the recording
+            - cadence (float): rolling cadence in steps per minute (0 if not available)
+
+        MODIFIES:
+            - self.live_stats_label
+
+        EFFECTS:
+            - Shows the live step count and cadence.
+        """
+        cadence_text = "{:.0f}".format(cadence) if cadence > 0 else "--"
+        self.live_stats_label.setText("Steps: {:d}    Cadence: {} steps/min".format(steps, cadence_text))
 
     def enablePlayButton(self):
         """
@@ -246,6 +271,7 @@ class RecordingFrame(QWidget):
 
         # set the execution state on false
         self.execution = False
+        self.setLiveStats(0, 0.0)
 
         # disable all buttons and selects except stop button
         self.changeEnabledAll()
@@ -1,11 +1,10 @@
 import threading
-import numpy as np
 
 class MtwThread(threading.Thread):
     """
     A thread class for performing the analysis and recording of the MTW devices.
     """
-    def __init__(self, Duration=90, MusicSamplesPath="../sonicwalk/audio_samples/cammino_1_fase_2", Exercise=0, sensitivityLev = 3, auto_detectLegs = True , selectedLeg=None, Analyze=True, setStart=None, CalculateBpm=False, shared_data=None, sound=True):
+    def __init__(self, Duration=90, MusicSamplesPath="../sonicwalk/audio_samples/cammino_1_fase_2", Exercise=0, sensitivityLev = 3, auto_detectLegs = True , selectedLeg=None, Analyze=True, setStart=None, CalculateBpm=False, shared_data=None, sound=True, maxGapFill=12):
         """    
         REQUIRES:
             - Duration (int): Duration of the recording in seconds. Defaults to 90.
@@ -18,6 +17,7 @@ class MtwThread(threading.Thread):
             - CalculateBpm (bool): Indicates whether to calculate BPM during analysis. Defaults to False.
             - shared_data (SharedData): Pre-initialized object from sharedVariables module. Defaults to None.
             - sound: a boolean indicating if the real time sound must be played during the exercise.
+            - maxGapFill (int): Longest run of lost samples (packet loss) interpolated in the live and saved signals, 0 disables. Defaults to 12.
 
         MODIFIES: 
             - self
@@ -42,6 +42,8 @@ class MtwThread(threading.Thread):
         self.sound = sound
         self.auto_detectLegs = auto_detectLegs
         self.sensitivity = sensitivityLev
+        self.maxGapFill = maxGapFill
+        self.gap_statistics = None
 
     def run(self):
         """    
@@ -52,32 +54,30 @@ class MtwThread(threading.Thread):
             - start the thread and run the analysis and the recording with mtw sensors by calling mtwRecord on MtwAwinda object
         """
         from sonicwalk import mtw
+        from sonicwalk.sensorRecords import alignRecords
         try:
-            with mtw.MtwAwinda(120, 19, self.MusicSamplesPath) as mtw:
+            # persistent session: the sensors stay connected between the exercises (released by clean)
+            with mtw.MtwAwinda(120, 19, self.MusicSamplesPath, persistent=True) as mtw:
                 self.mtw = mtw
-                data = mtw.mtwRecord(duration=self.Duration, plot=False, analyze=self.Analyze, exType=self.Exercise, sensitivityLev = self.sensitivity, auto_detectLegs = self.auto_detectLegs, selectedLeg = self.selectedLeg, calculateBpm=self.CalculateBpm, shared_data=self.shared_data, setStart=self.setStart, sound = self.sound)
+                data = mtw.mtwRecord(duration=self.Duration, plot=False, analyze=self.Analyze, exType=self.Exercise, sensitivityLev = self.sensitivity, auto_detectLegs = self.auto_detectLegs, selectedLeg = self.selectedLeg, calculateBpm=self.CalculateBpm, shared_data=self.shared_data, setStart=self.setStart, sound = self.sound, maxGapFill = self.maxGapFill)
                 
             if data is not None:
-                data0 = data[0][0]
-                data1 = data[0][1]
-                index0 = data[1][0]
-                index1 = data[1][1]
                 bpmValue = data[3]
+                records = data[4]
+                self.gap_statistics = data[5]
 
                 print(f"bpm value {bpmValue}")
+                print(f"packet loss {self.gap_statistics}")
 
-                pitch0 = data0[:index0]
-                pitch1 = data1[:index1]
+                # the records returned have the samples lost by the radio link already interpolated,
+                # resample all the legs onto one shared time grid using the hardware timestamps of the sensors
+                Fs = mtw.getUpdateRate()
+                _, combined_data = alignRecords(records, Fs, "pitch")
 
-                max_length = max(len(pitch0), len(pitch1))
-                new_pitch0 = np.pad(pitch0, (0, max_length - len(pitch0)), mode='constant')
-                new_pitch1 = np.pad(pitch1, (0, max_length - len(pitch1)), mode='constant')
-
-                combined_data = np.vstack((new_pitch0, new_pitch1))
-
-                Fs = max_length / self.Duration
-
-                self.result = combined_data, Fs, bpmValue
+                if combined_data.shape[1] == 0:
+                    self.result = Exception("The data of the sensors do not overlap in time, nothing has been recorded.")
+                else:
+                    self.result = combined_data, Fs, bpmValue
 
             else: 
                 if self.stop_plotter is not None: self.stop_plotter()   # stop and clean the plotter
@@ -107,6 +107,10 @@ class MtwThread(threading.Thread):
         self.mtw.stopRecording()    # stop mtw recording
 
     def clean(self):
-        self.mtw.clean()
+        """
+        EFFECTS:
+            - releases the MTW devices (closes the persistent session).
+        """
+        if self.mtw is not None: self.mtw.clean()
 
 
@@ -2,10 +2,10 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtCore import QTimer, pyqtSignal, Qt
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-import numpy as np
 from GUI.frames.patientFrame import PatientFrame
 from GUI.frames.exerciseFrame import ExerciseFrame
 from GUI.frames.recordingFrame import RecordingFrame
+from GUI.components.eventMonitor import EventMonitor
 import sys
 import os
 sys.path.append("../")
@@ -22,8 +22,14 @@ class AnalysisPage(QWidget):
         self.playButtonAbilited = False
         self.allEnabled = True
         self.shared_data = SharedData()
+        self.plotted_sequences = None   # sequences of the rings at the last redraw
+        self.signal_colors = ['b', 'c', 'g', 'm']
         self.setup_ui()
 
+        # live step events published by the analyzers (batched, see EventMonitor)
+        self.event_monitor = EventMonitor(self.shared_data)
+        self.event_monitor.statsUpdated.connect(self.actions_frame.setLiveStats)
+
         self.stopPlotterSignal.connect(self.stop_plotter)
 
     def setup_ui(self):
@@ -148,9 +154,11 @@ class AnalysisPage(QWidget):
 
         EFFECTS:    
             - Initializes, Shows and Starts the plotter thread class for dynamic plotter.
+            - Starts following the step events of the analyzers.
         """
         if hasattr(self, 'timer'):
             self.timer.stop()
+        self.event_monitor.start()
 
         self.timer = QTimer(self)
         self.timer.timeout.connect(self.update_plot)
@@ -176,22 +184,24 @@ class AnalysisPage(QWidget):
     def update_plot(self):
         """
         REQUIRES: 
-            - data0 (np.ndarray): Array containing data of signal 0.
-            - data1 (np.ndarray): Array containing data of signal 1.
+            - self.shared_data (SharedData): shared rings containing the signals of the sensors.
 
         EFFECTS:    
-            - Updates the dynamic plotter with new data.
+            - Updates the dynamic plotter with the newest samples in chronological order (only while recording
+              and only if a packet landed since the last redraw), the detected steps are marked on the signals.
         """
-        data0 = np.array(self.shared_data.data0)
-        data1 = np.array(self.shared_data.data1)
-
-        # if 1000 in data0 or 1000 in data1: 
-        #     self.setSaved(None)
-        #     return
-
+        if not self.shared_data.control.isRunning(): return
+        sequences = [ring.sequence() for ring in self.shared_data.rings]
+        if sequences == self.plotted_sequences: return
+        self.plotted_sequences = sequences
         self.ax.clear()
-        self.ax.plot(data0, 'b', label = "Right Leg")
-        self.ax.plot(data1, 'c', label = "Left Leg")
+        for i, ring in enumerate(self.shared_data.rings):
+            signal = ring.latest(ring.capacity)
+            color = self.signal_colors[i % len(self.signal_colors)]
+            self.ax.plot(signal, color, label = self.signal_label(i))
+            first = sequences[i] - signal.size   # global index of signal[0]
+            markers = self.event_monitor.stepMarkers(i, first, sequences[i]) - first
+            if markers.size > 0: self.ax.plot(markers, signal[markers], color + 'o', markersize=5)
         self.ax.set_xticks([])
         self.ax.grid(True, color="#FFE6E6")
         self.ax.legend(loc='lower right')
@@ -213,16 +223,24 @@ class AnalysisPage(QWidget):
         self.ax.grid(True, color="#FFE6E6")
         self.fig.patch.set_facecolor('none')
         if data is not None:
-            self.ax.plot(data[0], 'b', label = "Right Leg")
-            self.ax.plot(data[1], 'c', label = "Left Leg")
+            for i, signal in enumerate(data):
+                self.ax.plot(signal, self.signal_colors[i % len(self.signal_colors)], label = self.signal_label(i))
             self.ax.legend(loc='lower right')
         self.fig.subplots_adjust(left=0.1, right=0.9, top=0.9, bottom=0.1, wspace=0.1, hspace=0)
         self.canvas.draw()
         self.reset_shared_data()
 
+    def signal_label(self, i):
+        """
+        EFFECTS:    
+            - Returns the legend label of the i-th sensor signal.
+        """
+        return ["Right Leg", "Left Leg"][i] if i < 2 else f"Sensor {i}"
+
     def stop_plotter(self):
         if hasattr(self, 'timer'):
             self.timer.stop()
+        self.event_monitor.stop()
         
     def reset_shared_data(self):
         """
@@ -230,11 +248,11 @@ class AnalysisPage(QWidget):
             - self SharedData object
 
         EFFECTS:    
-            - Resets shared data (all 0).
-        """
-        self.shared_data.index0.value = 0
-        self.shared_data.index1.value = 0
-        for i in range(len(self.shared_data.data0)):
-            self.shared_data.data0[i] = 0
-        for i in range(len(self.shared_data.data1)):
-            self.shared_data.data1[i] = 0
\ No newline at end of file
+            - Resets shared data (all 0, idle recording state).
+        """
+        for ring in self.shared_data.rings:
+            ring.reset()
+        for log in self.shared_data.events:
+            log.reset()
+        self.shared_data.control.reset()
+        self.plotted_sequences = None
\ No newline at end of file
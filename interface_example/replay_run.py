@@ -0,0 +1,25 @@
+import sys
+sys.path.append("../sonicwalk")
+
+import time
+import replay
+
+# HARDWARE-FREE RUNNING EXAMPLE
+    # replays a recording saved by the GUI through the analyzers and prints the detected points
+    # usage: python replay_run.py <recording.csv> [speed]   (speed 0 --> as fast as possible)
+
+if __name__ == "__main__":
+
+    path = sys.argv[1] if len(sys.argv) > 1 else "../GUI/data/archive/00001/2024-09-03_session_01/walk_realTime_00001_session_01_2024-05-12_172356.csv"
+    speed = float(sys.argv[2]) if len(sys.argv) > 2 else 1
+
+    with replay.MtwReplay(path, speed=speed) as source:
+        start = time.time()
+        data = source.mtwRecord(3600, plot=False, analyze=True, exType=0, selectedLeg=True, sound=False)
+            # 0 --> walking
+        elapsed = time.time() - start
+
+    print("replayed {} samples in {:.2f} s".format(list(data[1]), elapsed))
+    print("maximum number of samples drained per iteration: {}".format(source.getMaxDrainedPerIteration()))
+    for i, points in enumerate(data[2]):
+        print("sensor {:d}: {:d} interesting points".format(i, len(points)))
@@ -0,0 +1,364 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Batch analysis of whole recordings.
+# Gives the same events of the streaming detectors (see detectors.py) fed with the samples of a recording
+# on the sample clock, but the features of the windows (zero crossings, gradients, maximums) are computed
+# with vectorized passes over the whole signal: the state of the detectors is only updated on the few
+# windows where something can happen (e.g. a zero crossing), instead of once for each sample.
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from detectors import Detector, Event, MOVEMENT, LEG_DETECTED, SMOOTHING_KERNEL, CausalSmoother, newGradientThreshold
+from sensitivity import sensitivityLevel
+
+WINSIZE = Detector.WINSIZE
+
+def slidingWindows(signal):
+    """
+    Effects:
+        Returns: read only view with a row for each window of WINSIZE samples of signal,
+                 row k is the window analyzed when sample k + WINSIZE - 1 arrives.
+    """
+    return sliding_window_view(np.asarray(signal, dtype=np.float64), WINSIZE)
+
+def zeroCrossings(windows):
+    """
+    Vectorized zeroCrossingDetector on all the windows.
+
+    Requires:
+        windows (numpy.array): a row for each window (see slidingWindows).
+    Effects:
+        Returns: tuple (rows, gradients), numpy.arrays with the windows holding a single zero crossing
+                 (the others are noise for the detectors) and the gradient at the zero crossing.
+                 The crossing is positive if the gradient is not negative (np.signbit).
+    """
+    signs = np.signbit(windows)
+    cross = signs[:, 1:] != signs[:, :-1]
+    rows = np.flatnonzero(np.count_nonzero(cross, axis=1) == 1)
+    position = np.argmax(cross[rows], axis=1) + 1   #index of the value where zero is crossed
+    window = windows[rows]
+    last = position == WINSIZE - 1
+    inner = np.where(last, position - 1, position)     #keep the indices valid, the last position is handled below
+    # same values of np.gradient: central differences inside the window, one sided at its end
+    gradients = np.where(last,
+                         (window[np.arange(rows.size), position] - window[np.arange(rows.size), position - 1]) / 1.0,
+                         (window[np.arange(rows.size), inner + 1] - window[np.arange(rows.size), inner - 1]) / 2.0)
+    return rows, gradients
+
+################################ EXERCISES =======================================================================
+
+def walk(signal, times, params, start=0):
+    """Events of WalkDetector, params (sensitivity.WalkParameters) are the parameters of the sensitivity level"""
+    displacement = params.displacement
+    validRange = params.validRange
+    min_threshold = params.min_threshold
+    time_threshold = params.time_threshold
+
+    windows = slidingWindows(signal - displacement)
+    maxima = windows.max(axis=1)
+    rows, gradients = zeroCrossings(windows)
+
+    events = []
+    threshold = min_threshold
+    history_sz = 10
+    peakHistory = np.full(history_sz, 5.0, dtype=np.float64)
+    peak = 0.0
+    swingPhase = False
+    timestamp = times[0]
+    last = start - 1    #last window whose maximum has been accumulated in the peak
+    for row, gradient in zip(rows[rows >= start], gradients[rows >= start]):
+        # the peak is updated with the maximum of every window of the swing phase
+        if swingPhase: peak = np.max([peak, np.max(maxima[last + 1:row + 1])])
+        last = row
+        if np.signbit(gradient):    #negative zero crossing
+            if swingPhase:
+                now = times[row + WINSIZE - 1]
+                if peak >= threshold - validRange and now - timestamp > time_threshold:
+                    swingPhase = False
+                    timestamp = now
+                    peakHistory[len(events) % history_sz] = peak
+                    events.append(Event(int(row + WINSIZE - 1), timestamp, MOVEMENT))
+                    newthresh = np.min(peakHistory)
+                    threshold = newthresh if newthresh > min_threshold else min_threshold
+            peak = 0.0
+        else:
+            swingPhase = True
+    return events
+
+def march(signal, times, threshold, exType=1, start=0):
+    """Events of MarchDetector, threshold is the threshold of the sensitivity level (sensitivity.MarchParameters)"""
+    timeThreshold = 0.1
+    signal = np.asarray(signal, dtype=np.float64)
+    if exType == 1: signal = - signal
+    rows, gradients = zeroCrossings(slidingWindows(signal - threshold))
+
+    events = []
+    swingPhase = False
+    timestamp = times[0]
+    for row, gradient in zip(rows[rows >= start], gradients[rows >= start]):
+        if np.signbit(gradient):
+            if swingPhase:
+                now = times[row + WINSIZE - 1]
+                if now - timestamp > timeThreshold:
+                    swingPhase = False
+                    timestamp = now
+                    events.append(Event(int(row + WINSIZE - 1), timestamp, MOVEMENT))
+        else:
+            swingPhase = True
+    return events
+
+def swingStepLeg(signal, times, params, start=0):
+    """
+    Events of the step leg of SwingDetector, params (sensitivity.StepLegParameters) are the parameters of the sensitivity level.
+    The detector compares consecutive samples (not windows), so its state machine is run on every sample:
+    the clipped values kept by the detector for the next comparisons are reproduced as well.
+    """
+    time_threshold = params.time_threshold
+    min_peak_threshold = params.min_peak_threshold
+    validRange = params.validRange
+    displacement = 5
+
+    samples = np.asarray(signal, dtype=np.float64)
+    events = []
+    threshold = min_peak_threshold
+    history_sz = 10
+    peakHistory = np.full(history_sz, 5.0, dtype=np.float64)
+    foundedPeak = False
+    pos = True
+    findMininmum = False
+    firstpeak = False
+    previous = None
+    window = None
+    timestamp = times[0]
+    movements = 0
+
+    def clip(value, pos):
+        return 0.0 if (value <= 0 if pos else value >= 0) else value
+
+    for k in range(start + WINSIZE - 1, samples.size):
+        pitch = samples[k]
+        now = times[k]
+        if previous is None:
+            previous, window = window, pitch
+            continue
+
+        max_time_wait = 0.4 if not pos else 0.3
+        if now - timestamp >= max_time_wait and firstpeak and not foundedPeak:
+            events.append(Event(k, timestamp, MOVEMENT))
+            movements += 1
+            foundedPeak = True
+            findMininmum = not findMininmum
+            previous, window = window, pitch
+            timestamp = now
+            continue
+
+        if findMininmum == pos and pos == True:
+            # shifted copies, the samples kept are not modified
+            p, prev, win = clip(pitch + displacement, pos), clip(previous + displacement, pos), clip(window + displacement, pos)
+        else:
+            # the samples kept are clipped in place by the detector
+            pitch, previous, window = clip(pitch, pos), clip(previous, pos), clip(window, pos)
+            p, prev, win = pitch, previous, window
+
+        if not findMininmum: findedPeak = win > prev and win > p and ((win >= 0 and pos) or (win < 0 and not pos))
+        else: findedPeak = win < prev and win < p and ((win >= 0 and pos) or (win < 0 and not pos))
+
+        if findedPeak:
+            peak = abs(win)
+            elapsed_time = now - timestamp
+            thresh = 0 if findMininmum == pos else threshold - validRange
+            if elapsed_time > time_threshold and peak > thresh:
+                timestamp = now
+                if findMininmum != pos:
+                    peakHistory[movements % history_sz] = peak
+                    newthresh = np.min(peakHistory)
+                    threshold = newthresh if newthresh > min_peak_threshold else min_peak_threshold
+                if not firstpeak:
+                    findMininmum = not findMininmum
+                    firstpeak = True
+                elif not foundedPeak:
+                    foundedPeak = True
+                    findMininmum = not findMininmum
+                    events.append(Event(k, timestamp, MOVEMENT))
+                    movements += 1
+                else:
+                    pos = not pos
+                    findMininmum = not findMininmum
+                    foundedPeak = False
+                    firstpeak = False
+
+        previous, window = window, pitch
+    return events
+
+def _alternateZeroCrossings(signal, times, displacements, params, start, valid):
+    """
+    Zero crossings of otherLeg and tandemFunction: a valid crossing (within the adaptive gradient threshold
+    and the time threshold) is an event, the shift of the signal (displacements[state]) changes with the state
+    after each event if the two displacements differ.
+    valid(state, positive) tells if a crossing is the one searched in state.
+    """
+    valid_gradient_range = params.valid_gradient_range
+    time_threshold = params.time_threshold
+    min_gradient_threshold = params.min_gradient_threshold
+    alpha = params.alpha
+
+    signal = np.asarray(signal, dtype=np.float64)
+    crossings = {state: zeroCrossings(slidingWindows(signal + displacement)) for state, displacement in displacements.items()}
+    candidates = np.unique(np.concatenate([rows for rows, _ in crossings.values()]))
+
+    events = []
+    gradientThreshold = min_gradient_threshold
+    state = True
+    timestamp = times[0]
+    for row in candidates[candidates >= start]:
+        rows, gradients = crossings[state]
+        i = np.searchsorted(rows, row)
+        if i == rows.size or rows[i] != row: continue   #no crossing in the window for the current shift
+        absGradient = abs(gradients[i])
+        if not absGradient < gradientThreshold + valid_gradient_range: continue
+        if valid(state, not np.signbit(gradients[i])):
+            now = times[row + WINSIZE - 1]
+            if now - timestamp > time_threshold:
+                if len(displacements) > 1: state = not state
+                timestamp = now
+                events.append(Event(int(row + WINSIZE - 1), timestamp, MOVEMENT))
+                gradientThreshold = newGradientThreshold(gradientThreshold, newGradient=absGradient, alpha=alpha, min_value=min_gradient_threshold)
+    return events
+
+def swingOtherLeg(signal, times, params, start=0):
+    """Events of the other leg of SwingDetector, params (sensitivity.OtherLegParameters) are the parameters of the sensitivity level"""
+    # state: True while searching the positive zero crossing (signal shifted up), False for the negative one
+    displacements = {True: params.displacement, False: - params.displacement}
+    return _alternateZeroCrossings(signal, times, displacements, params, start, lambda state, positive: positive == state)
+
+def tandem(signal, times, params, forward=True, start=0):
+    """Events of TandemDetector, params (sensitivity.TandemParameters) are the parameters of the sensitivity level"""
+    displacement = params.displacement0 if forward else params.displacement1
+    return _alternateZeroCrossings(signal, times, {True: displacement}, params, start, lambda state, positive: positive != forward)
+
+def detectLeg(signal, displacement, kernel=SMOOTHING_KERNEL):
+    """
+    Automatic leg detection of a sensor (see detectors.LegAutoDetection) run alone.
+
+    Effects:
+        Returns: index of the first window where the sensor claims to be the step leg, None if it never does.
+        The signal is filtered once with the same causal filter of the live detection (detectors.CausalSmoother).
+    """
+    windows = slidingWindows(CausalSmoother(kernel).apply(signal) - displacement)
+    rows, gradients = zeroCrossings(windows)
+    peak = 0.0
+    for row, gradient in zip(rows, gradients):
+        if np.signbit(gradient): continue
+        if peak < - displacement - 0.1: return int(row)
+        peak = min(float(np.min(windows[row])), peak)
+    return None
+
+################################ RECORDING =======================================================================
+
+def analyzeRecording(signals, Fs, exType, sensitivity=3, selectedLeg=None, auto_detectLegs=True, parameters=None):
+    """
+    Requires:
+        signals (numpy.array): pitch of the recording, a row for each sensor (e.g. shape (2, N)).
+        Fs (float): sampling frequency in Hz.
+        exType (int): exercise type (see detectors.createDetector).
+        sensitivity (int): level of sensitivity in range 1 to 5.
+        selectedLeg (bool, optional): True if the first sensor is on the step (forward) leg (exType 3 and 4),
+                                      the second sensor is assumed on the other leg as in recorder.mtwRecord.
+        auto_detectLegs (bool): the legs are detected automatically instead of selectedLeg (exType 3 and 4).
+        parameters (sensitivity.SensitivityLevel, optional): parameters of the exercises, defaults to the parameters
+                                                             of the sensitivity level in sensitivity_levels.json.
+    Effects:
+        Returns: for each sensor the list of the events (see detectors.Event) that the streaming detectors
+                 give when fed with the recording on the sample clock (the time of sample k is k / Fs).
+                 With auto_detectLegs the first sensor to claim the step leg wins (the lowest one on a tie)
+                 and the other ones start their analysis from the same window.
+    """
+    if parameters is None: parameters = sensitivityLevel(sensitivity)
+    signals = np.atleast_2d(np.asarray(signals, dtype=np.float64))
+    times = np.arange(signals.shape[1]) / Fs
+    results = [[] for _ in signals]
+    if signals.shape[1] < WINSIZE: return results
+
+    if exType == 0:
+        return [walk(signal, times, parameters.walk) for signal in signals]
+    if exType == 1 or exType == 2:
+        return [march(signal, times, parameters.march.threshold, exType) for signal in signals]
+    if exType == 3:
+        stepLeg = lambda signal, start: swingStepLeg(signal, times, parameters.swing.step_leg, start)
+        otherLeg = lambda signal, start: swingOtherLeg(signal, times, parameters.swing.other_leg, start)
+        legDetection = parameters.swing.leg_detection
+    elif exType == 4:
+        stepLeg = lambda signal, start: tandem(signal, times, parameters.tandem, True, start)
+        otherLeg = lambda signal, start: tandem(signal, times, parameters.tandem, False, start)
+        legDetection = parameters.tandem.leg_detection
+    else:
+        return results
+
+    if auto_detectLegs:
+        detections = [detectLeg(signal, legDetection.displacement) for signal in signals]
+        candidates = [(row, i) for i, row in enumerate(detections) if row is not None]
+        if not candidates: return results
+        row, winner = min(candidates)
+        for i, signal in enumerate(signals):
+            if i == winner: results[i] = [Event(row + WINSIZE - 1, times[row + WINSIZE - 1], LEG_DETECTED)] + stepLeg(signal, row)
+            else: results[i] = otherLeg(signal, row)
+        return results
+
+    if selectedLeg is None: return results
+    for i, signal in enumerate(signals):
+        leg = selectedLeg if i % 2 == 0 else not selectedLeg
+        results[i] = stepLeg(signal, 0) if leg else otherLeg(signal, 0)
+    return results
+
+def movementIndices(events):
+    """
+    Effects:
+        Returns: numpy.array with the sample indices of the movements (the interesting points of recorder.mtwRecord).
+    """
+    return np.array([event.sampleIndex for event in events if event.eventType == MOVEMENT], dtype=np.int64)
+
+def removeOutliers(elapsed):
+    """
+    Effects:
+        Returns: elapsed without the values whose z-score is above 3 (elapsed if all of them would be removed).
+    """
+    if elapsed.size == 0: return elapsed
+    mean_elapsed_time = np.mean(elapsed)
+    std_dev_elapsed_time = np.std(elapsed)
+    if std_dev_elapsed_time == 0 or np.isnan(std_dev_elapsed_time): return elapsed
+    z_scores = (elapsed - mean_elapsed_time) / std_dev_elapsed_time
+    filtered = elapsed[np.abs(z_scores) <= 3]
+    return filtered if filtered.size != 0 else elapsed
+
+def estimateBpm(times):
+    """
+    Requires:
+        times (numpy.array): times in seconds of the movements of all the sensors.
+    Effects:
+        Returns: average beats (movements) per minute, from the intervals between consecutive movements
+                 without outliers, False if it cannot be estimated.
+    """
+    elapsed_times = removeOutliers(np.diff(np.sort(np.asarray(times, dtype=np.float64))))
+    if elapsed_times.size == 0: return False
+    mediumTimeValue = np.mean(elapsed_times) / 60 # Mean in minutes
+    return 1 / mediumTimeValue if mediumTimeValue != 0 else False
@@ -0,0 +1,111 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Per-sample cost of the detection on recorded signals (microseconds for each sample of a sensor):
+# - the building blocks of the detectors, each timed with the numpy implementation they replace
+# - the streaming detectors fed one sample at a time, as the analyzers are during a recording
+# - the batch analysis of the whole recording
+#
+#   python sonicwalk/benchmark.py [recording.csv ...]     (default: the recordings of GUI/data/archive)
+
+import os
+import glob
+import time
+import argparse
+import numpy as np
+from sensorRecords import readRecording
+from detectors import Detector, SlidingExtrema, ZeroCrossingTracker, zeroCrossingDetector, createDetector
+from sensitivity import sensitivityLevel
+from batch import analyzeRecording
+from reanalyze import exerciseType
+
+def perSample(function, samples, repeat=3):
+    """Best time in microseconds for each sample of function(), which processes the given number of samples"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return 1e6 * best / samples
+
+def numpyExtrema(signal):
+    """Extrema of every window computed on a copy of the window, as the detectors did"""
+    winsize = Detector.WINSIZE
+    for end in range(winsize, signal.size + 1):
+        window = signal[end - winsize:end].copy()
+        np.max(window), np.min(window)
+
+def slidingExtrema(signal):
+    extrema = SlidingExtrema(Detector.WINSIZE)
+    for value in signal.tolist():
+        extrema.push(value)
+        extrema.max(), extrema.min()
+
+def numpyZeroCrossings(signal):
+    """zeroCrossingDetector on every shifted window, as the detectors did"""
+    winsize = Detector.WINSIZE
+    for end in range(winsize, signal.size + 1):
+        zeroCrossingDetector(signal[end - winsize:end].copy() - 5.0, positive=False)
+
+def trackedZeroCrossings(signal):
+    crossings = ZeroCrossingTracker(Detector.WINSIZE, -5.0)
+    for value in signal.tolist():
+        crossings.push(value)
+        crossings.detect(positive=False)
+
+def streaming(signals, Fs, exType, parameters):
+    """Feeds the detectors of the sensors one sample at a time"""
+    detectors = [createDetector(exType, parameters, selectedLeg=(i % 2 == 0)) for i in range(signals.shape[0])]
+    times = np.arange(signals.shape[1]) / Fs
+    for k in range(signals.shape[1]):
+        for i, detector in enumerate(detectors):
+            detector.feed(signals[i, k:k + 1], times[k:k + 1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-sample cost of the SonicWalk detectors")
+    parser.add_argument("recordings", nargs="*", help="csv recordings (default: the recordings of GUI/data/archive)")
+    parser.add_argument("-s", "--sensitivity", type=int, default=3, choices=range(1, 6), help="sensitivity level (default: 3)")
+    parser.add_argument("-r", "--repeat", type=int, default=3, help="runs of each measure, the best is kept (default: 3)")
+    args = parser.parse_args(argv)
+
+    recordings = args.recordings or sorted(glob.glob(os.path.join("GUI", "data", "archive", "*", "*", "*.csv")))
+    parameters = sensitivityLevel(args.sensitivity)
+    print("{:<40s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s} {:>10s}".format(
+        "recording (us/sample)", "np extrema", "sliding", "np zc", "zc tracker", "streaming", "batch", "samples"))
+    for path in recordings:
+        exercise, exType = exerciseType(path)
+        if exType is None: continue
+        signals, Fs = readRecording(path)
+        samples = signals.size
+        signal = signals[0]
+        print("{:<40s} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f} {:>10d}".format(
+            os.path.basename(path)[:40],
+            perSample(lambda: numpyExtrema(signal), signal.size, args.repeat),
+            perSample(lambda: slidingExtrema(signal), signal.size, args.repeat),
+            perSample(lambda: numpyZeroCrossings(signal), signal.size, args.repeat),
+            perSample(lambda: trackedZeroCrossings(signal), signal.size, args.repeat),
+            perSample(lambda: streaming(signals, Fs, exType, parameters), samples, args.repeat),
+            perSample(lambda: analyzeRecording(signals, Fs, exType, args.sensitivity, selectedLeg=True, auto_detectLegs=False, parameters=parameters), samples, args.repeat),
+            samples))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,954 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Streaming detectors of the interesting points of the exercises.
+# A detector is fed with the pitch samples of one sensor and their timestamps (in seconds)
+# and returns the events detected on them: it does not depend on shared memory, sound or the clock,
+# so the same detection logic runs in the analyzer processes and offline on recorded signals.
+
+from collections import namedtuple, deque
+import math
+import numpy as np
+
+# version of the detection logic: to be increased by every change of the detectors that changes their events
+# (recordings analyzed with another version are analyzed again, see reanalyze.py)
+DETECTOR_VERSION = 2
+
+# event types (same codes as sharedVariables.SharedEventLog)
+MOVEMENT = 1        #complete movement (step), the interesting points of the recording
+LEG_DETECTED = 2    #the leg of the sensor has been automatically detected as the step leg
+
+# sampleIndex: index of the newest sample of the window the event was detected on
+# time: timestamp of the event (see the detectors for the events that keep the time of an earlier sample)
+Event = namedtuple("Event", ["sampleIndex", "time", "eventType"])
+
+# maximum and minimum of a window of samples
+Extrema = namedtuple("Extrema", ["max", "min"])
+
+################################ UTILS ======================================================== && Rob ========
+
+def extrema(window):
+    """Extrema of the samples of window (numpy.array)"""
+    return Extrema(float(np.max(window)), float(np.min(window)))
+
+def clipExtrema(window, positive):
+    """Extrema of window once the values <= 0 (positive) or >= 0 (not positive) are replaced with 0"""
+    if positive: return Extrema(window.max if window.max > 0 else 0.0, window.min if window.min > 0 else 0.0)
+    return Extrema(window.max if window.max < 0 else 0.0, window.min if window.min < 0 else 0.0)
+
+class SlidingExtrema():
+    """
+        Maximum and minimum of the last size values pushed (the sliding window ending with the newest value),
+        kept with two monotonic deques: push() is amortized O(1) and reading them does not call numpy
+        nor build the window.
+    """
+    def __init__(self, size):
+        self.size = size
+        self.__count = 0
+        self.__maxima = deque()     #(index, value) of the candidate maximums, decreasing values
+        self.__minima = deque()     #(index, value) of the candidate minimums, increasing values
+
+    def push(self, value):
+        index = self.__count
+        self.__count += 1
+        maxima = self.__maxima
+        while maxima and maxima[-1][1] <= value: maxima.pop()
+        maxima.append((index, value))
+        if maxima[0][0] <= index - self.size: maxima.popleft()
+        minima = self.__minima
+        while minima and minima[-1][1] >= value: minima.pop()
+        minima.append((index, value))
+        if minima[0][0] <= index - self.size: minima.popleft()
+
+    def full(self):
+        """True once size values have been pushed"""
+        return self.__count >= self.size
+
+    def max(self):
+        return self.__maxima[0][1]
+
+    def min(self):
+        return self.__minima[0][1]
+
+    def extrema(self):
+        return Extrema(self.__maxima[0][1], self.__minima[0][1])
+
+class ZeroCrossingDetectionResult:
+    __slots__ = ("founded", "gradient", "absGradient")
+
+    def __init__(self, found_crossing=False, gradient=None):
+        self.set(found_crossing, gradient)
+
+    def set(self, found_crossing, gradient):
+        self.founded = found_crossing
+        self.gradient = gradient
+        self.absGradient = None if gradient is None else abs(gradient)
+        return self
+
+def peakFinder(window, previous_window, current_window, minimum = False, positive = None):
+    """
+    Determine if there is a positive or negative peak in the window.
+
+    Requires:
+        window (Extrema): Maximum and minimum of the window to analyze for the presence of a peak.
+        previous_window (Extrema): Maximum and minimum of the previous window.
+        current_window (Extrema): Maximum and minimum of the current window.
+        minimum (bool, optional): Indicates whether the research is for peak or minimum.
+                                   Defaults to False (peak).
+        positive (bool, optional): Indicates whether the research is for positive or negative peak or minimum.
+                        Defaults to None.
+    Effects:
+        Returns: bool True if a positive or negative peak is detected in the window; otherwise, False.
+        Using this function allows the determination of a positive or negative peak with a single window delay.
+    """
+
+    # This approach allows for identifying the presence of a peak within a time window of the subsequent one.
+    # Peak detection involves comparing the maximums or minimums of the windows, thus helping to reduce noise.
+    # Indeed, directly comparing 3 samples instead of windows could lead to incorrect identifications
+    # due to erroneous value oscillations caused by noise.
+
+        # Due to window overlap, we might not detect peaks correctly, as a maximum in one window could reappear in the next.
+        # For this reason, we SLIGHTLY modify the window values by smoothing them with a Gaussian filter.
+        # This allows us to further reduce noise and improve peak detection.
+
+        # Note:
+        # Using an aggressive Gaussian filter applied to windows could create additional peaks where none exist.
+
+        # window = gaussian_filter1d(window, sigma=0.6)
+        # previous_window = gaussian_filter1d(previous_window, sigma=0.6)
+        # current_window = gaussian_filter1d(current_window, sigma=0.6)
+
+    # The windows are given by their extrema (see SlidingExtrema), the comparisons do not call numpy.
+
+    if not minimum:
+        peak = window.max
+        if peak > previous_window.max and peak > current_window.max:
+            # peak into window
+            if (positive is None) or (peak >= 0 and positive) or (peak < 0 and not positive):
+                return True
+    else:
+        peak = window.min
+        if peak < previous_window.min and peak < current_window.min:
+            # minimum into window
+            if (positive is None) or (peak >= 0 and positive) or (peak < 0 and not positive):
+                return True
+    return False
+
+def phaseAnalyzer(current_window, previous_window, increasing_phase = True):
+    """
+    Analyze the phase of the system based on current and previous windows.
+
+    Requires:
+        current_window (Extrema): Maximum and minimum of the current window of data.
+        previous_window (Extrema): Maximum and minimum of the previous window of data.
+        increasing_phase (bool, optional): Indicates whether the method has to verify in an increasing or decreasing phase.
+                                            Defaults to True (increasing phase).
+
+    Effects:
+        Returns: bool True if the system detects the specified phase.
+        This function determines whether the system is in an increasing or decreasing phase
+        by comparing the maximum and minimum values of the current window with those of the previous window.
+    """
+
+    # This approach allows identifying the rising or falling phase between two windows.
+    # Identification involves comparing the maximums or minimums of the windows, thus helping to reduce noise.
+
+    if increasing_phase:
+        if current_window.max > previous_window.max:
+            # Rising phase
+            return True
+        else:
+            return False
+    else:
+        if current_window.min <= previous_window.min:
+            # Falling phase
+            return True
+        else:
+            return False
+
+def zeroCrossingDetector(window, positive = True, maxAbsGradient = None):
+    """
+    Detect zero crossings in the window.
+
+    Requires:
+        window (list): The window to analyze for zero crossings.
+        positive (bool, optional): Indicates whether the zero crossing to detect is for positive or negative zero crossings.
+                                Defaults to True (positive zero crossing).
+        maxAbsGradient (float, optional): The maximum absolute value of the gradient. Defaults to None (no maximum).
+
+    Effects:
+        This function detects zero crossings in the given window, considering the specified polarity and gradient maximum threshold.
+        Returns: None if no zero crossing is detected
+        Returns: ZeroCrossingDetectionResult object if a zero crossing is detected.
+    """
+    # zero crossings count
+    cross =  np.diff(np.signbit(window))
+    if np.sum(cross) == 1: #If more than 1 zero crossing is found then it's noise
+        # determine position of zero crossing
+        crossPosition = np.where(cross)[0][0]
+
+        # determine the gradient of the zero crossing
+        gradient = np.gradient(window)[crossPosition + 1]
+        absGradient = abs(gradient)
+        if maxAbsGradient is None or absGradient < maxAbsGradient:
+            # determine polarity of zero-crossing (use np.gradient at index of zero crossing + 1 (the value where zero is crossed))
+            negativeZc = np.signbit(gradient)
+
+            founded = not negativeZc if positive else negativeZc
+
+            return ZeroCrossingDetectionResult(found_crossing=founded, gradient=gradient)
+    else:
+        return None
+
+class ZeroCrossingTracker():
+    """
+        zeroCrossingDetector on the sliding window of the last size values pushed, updated incrementally:
+        push() shifts the new value and compares its sign with the previous one, the crossings of the window
+        are kept in a queue, so detect() costs a few scalar operations instead of analyzing the whole window.
+        The window analyzed is (sign * value + displacement) for each value, sign is +1 or -1.
+        detect() returns the same record (ZeroCrossingDetectionResult) updated at every call.
+    """
+    def __init__(self, size, displacement=0.0, sign=1.0):
+        self.size = size
+        self.__sign = sign
+        self.__displacement = displacement
+        self.__values = [0.0] * size    #ring of the last size values pushed
+        self.__pitch = [0.0] * size     #ring of the shifted values
+        self.__count = 0                #number of values pushed
+        self.__crossings = deque()      #indexes of the values with sign different from the previous one
+        self.__negative = False         #sign bit of the newest shifted value
+        self.__result = ZeroCrossingDetectionResult()
+
+    def push(self, value):
+        index = self.__count
+        self.__count += 1
+        position = index % self.size
+        self.__values[position] = value
+        shifted = self.__sign * value + self.__displacement
+        self.__pitch[position] = shifted
+        negative = math.copysign(1.0, shifted) < 0     #np.signbit
+        if index > 0 and negative != self.__negative: self.__crossings.append(index)
+        self.__negative = negative
+        crossings = self.__crossings
+        while crossings and crossings[0] <= index - self.size + 1: crossings.popleft()    #crossing before the first value of the window
+
+    def shift(self, displacement, sign=1.0):
+        """Sets the shift of the window, the window is shifted again only if it changes"""
+        unchanged = displacement == self.__displacement and math.copysign(1.0, displacement) == math.copysign(1.0, self.__displacement)
+        if unchanged and sign == self.__sign: return     #(0.0 and -0.0 shift -0.0 differently)
+        self.__displacement = displacement
+        self.__sign = sign
+        values = self.__values
+        self.__values = [0.0] * self.size
+        self.__pitch = [0.0] * self.size
+        self.__crossings.clear()
+        pushed = self.__count
+        first = max(0, pushed - self.size)
+        self.__count = first
+        for index in range(first, pushed): self.push(values[index % self.size])
+
+    def detect(self, positive=True, maxAbsGradient=None):
+        """
+        Effects:
+            Same as zeroCrossingDetector(window, positive, maxAbsGradient) on the shifted window
+            of the last size values pushed (at least size values must have been pushed).
+        """
+        crossings = self.__crossings
+        if len(crossings) != 1: return None     #If more than 1 zero crossing is found then it's noise
+        # gradient at the value where zero is crossed (as np.gradient: central difference, one-sided on the newest value)
+        index = crossings[0]
+        pitch = self.__pitch
+        size = self.size
+        if index == self.__count - 1: gradient = pitch[index % size] - pitch[(index - 1) % size]
+        else: gradient = (pitch[(index + 1) % size] - pitch[(index - 1) % size]) / 2.0
+        if maxAbsGradient is None or abs(gradient) < maxAbsGradient:
+            negativeZc = math.copysign(1.0, gradient) < 0
+            return self.__result.set(not negativeZc if positive else negativeZc, gradient)
+        return None
+
+def gaussianKernel(sigma=1.0, truncate=2.0):
+    """
+    Effects:
+        Returns: tuple with the weights (sum 1) of the gaussian kernel with standard deviation sigma (samples),
+                 truncated at truncate standard deviations (as scipy.ndimage.gaussian_filter1d).
+    """
+    radius = int(truncate * sigma + 0.5)
+    weights = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    return tuple((weights / weights.sum()).tolist())
+
+# kernel of the smoothing of the automatic leg detection: 5 samples, delay of 2 samples (~17 ms)
+SMOOTHING_KERNEL = gaussianKernel(sigma=1.0, truncate=2.0)
+
+class CausalSmoother():
+    """
+        Causal FIR low-pass filter with carried state: every sample is filtered once, when it arrives,
+        as the weighted sum of the last len(kernel) samples (kernel[0] weights the newest one).
+        A symmetric kernel delays the signal by (len(kernel) - 1) / 2 samples. Before the first len(kernel) samples
+        the missing ones are taken equal to the first sample.
+        apply() filters a whole signal in vectorized form with the same operations in the same order,
+        so offline results are identical to the samples filtered live.
+    """
+    def __init__(self, kernel=SMOOTHING_KERNEL):
+        self.kernel = tuple(float(weight) for weight in kernel)
+        self.__history = deque(maxlen=len(self.kernel))     #last len(kernel) samples, the newest first
+
+    def push(self, value):
+        """Returns: the filtered value of the new sample value"""
+        history = self.__history
+        if not history: history.extend([value] * history.maxlen)
+        history.appendleft(value)
+        filtered = 0.0
+        for weight, sample in zip(self.kernel, history): filtered += weight * sample
+        return filtered
+
+    def apply(self, signal):
+        """
+        Effects:
+            Returns: numpy.array with the values of push() for each sample of signal, fed to a new filter.
+                     The state of this filter is not used nor modified.
+        """
+        signal = np.asarray(signal, dtype=np.float64)
+        if signal.size == 0: return signal.copy()
+        taps = len(self.kernel)
+        padded = np.concatenate((np.full(taps - 1, signal[0]), signal))
+        filtered = np.zeros(signal.size)
+        for k, weight in enumerate(self.kernel): filtered += weight * padded[taps - 1 - k:padded.size - k]
+        return filtered
+
+def newGradientThreshold(threshold, newGradient, alpha = 0.5, min_value = 0.4):
+    """
+        Requires:
+            threshold is the current gradient threshold
+            newGradient is a float value of current gradient
+            alpha is a float value between 0 and 1 indicating the weight of the new gradient compared to the old gradient threshold.
+        Effects:
+            Returns the gradient threshold updated with the new gradient.
+            The new threshold is the average of the new gradient and the old one.
+            EMA (Exponential Moving Average)
+    """
+
+    # Alpha ranges between 0 and 1.
+    # A smaller alpha gives more weight to the old average.
+    # A larger alpha gives more weight to the new average.
+
+    # EMA (Exponential Moving Average)
+    newMean = (alpha * newGradient) + ((1-alpha)*threshold)
+    return newMean if newMean > min_value else min_value
+
+class LegCoordinator():
+    """
+        Detected leg shared by the detectors of the two legs running in the same process
+        (same interface as sharedVariables.LegDetected, used between processes)
+    """
+    def __init__(self):
+        self.value = False
+
+    def set(self, value):
+        if self.value == value:
+            return False    # not setted
+        self.value = value
+        return True # setted
+
+    def get(self):
+        return self.value
+
+################################ DETECTOR ======================================================== && Rob ========
+
+class Detector():
+    """
+        Base class of the streaming detectors
+
+        feed() runs the detection once for each new sample, on the sliding window of the last WINSIZE samples
+        ending with it, and returns the events detected. The detectors keep what they need of the window
+        (extrema, zero crossings, filtered samples) up to date sample by sample. Subclasses implement the hooks:
+        - _sample(value): every sample fed (float), before the detection on the window ending with it
+        - _detect(now): detection on the window ending with the last sample, now is its timestamp
+        - _start(now): initialization with the timestamp of the first sample fed
+        and report the events with _emit().
+    """
+    WINSIZE = 15 #window duration is 8.33ms * 15 ~ 125 ms
+
+    def __init__(self):
+        self.movements = 0      #number of MOVEMENT events emitted
+        self.__fed = 0          #number of samples fed
+        self.__index = 0        #index of the next sample
+        self.__current = -1     #index of the newest sample of the window being analyzed
+        self.__events = []
+        self.__started = False
+
+    def feed(self, samples, timestamps, first=None):
+        """
+        Requires:
+            samples (numpy.array): new pitch samples of the sensor.
+            timestamps (numpy.array or float): timestamp in seconds of each sample (or one for all of them).
+            first (int, optional): index of samples[0], to be given if samples were skipped
+                                   (defaults to the index following the last sample fed).
+        Effects:
+            Returns: list with the events detected on the new samples (see Event), in order.
+        """
+        samples = np.asarray(samples, dtype=np.float64)
+        timestamps = np.broadcast_to(np.asarray(timestamps, dtype=np.float64), samples.shape)
+        if first is not None: self.__index = first
+        if samples.size == 0: return []
+        if not self.__started:
+            self.__started = True
+            self._start(float(timestamps[0]))
+
+        events = []
+        self.__events = events
+        values = samples.tolist()
+        times = timestamps.tolist()
+        for k in range(samples.size):
+            self._sample(values[k])
+            self.__fed += 1
+            if self.__fed < self.WINSIZE: continue   #no full window yet
+            self.__current = self.__index + k
+            self._detect(times[k])
+        self.__index += samples.size
+        return events
+
+    def _emit(self, time, eventType=MOVEMENT):
+        """Reports an event detected on the window being analyzed"""
+        self.__events.append(Event(self.__current, time, eventType))
+        if eventType == MOVEMENT: self.movements += 1
+
+    def _start(self, now):
+        pass
+
+    def _sample(self, value):
+        pass
+
+    def _detect(self, now):
+        raise NotImplementedError
+
+class LegAutoDetection():
+    """
+        Automatic detection of the step leg, shared by the detectors of the exercises with different legs
+    """
+
+    # IDEA:
+    # When starting an exercise, typically one begins with the leg stepping forward. Ideally, this leg will cross a positive zero crossing first.
+    # However, due to knee bending, a negative zero crossing typically occurs first in practice.
+
+    # ALGORITHM:
+    # The algorithm utilizes the concept of shared variables between processes, protected by locks.
+    # Processes are synchronized using a shared variable at startup.
+    # The first process to cross the zero crossing communicates this to the other process via another shared variable, allowing processes to distinguish themselves.
+
+    # Due to noise, unexpected zero crossings may occur. The algorithm addresses this as follows:
+    # 1. Gaussian Filtering: Filters the signal with a causal Gaussian filter to reduce noise and flatten the signal (critical at the start when both signals are close to zero).
+    #    Each sample is filtered once when it arrives (CausalSmoother), batch.detectLeg applies the same filter offline.
+    # 2. Signal Shifting: Shifts both signals downward to delay the detection of the positive zero crossing.
+    #    Due to inherent subjective differences in the analyzed signals, the signal that should not detect the zero crossing has a broader bell curve.
+    #    Therefore, with the same displacement, it is delayed even more, which works to our advantage (initially, processes did not start in sync).
+    # 3. Validating Positive Zero Crossing: When a positive zero crossing is found, it is considered valid only if the signal has recorded a negative peak at least 0.1 degrees lower than the displacement.
+    #    This accounts for the natural knee bending in "natural" movements. For the other foot, noise that is flattened (except for movements) will be lower than 0.1 degrees of displacement and will reach the positive zero crossing first.
+    #    For the other foot (except for movements), it is unlikely that the noise, which is flattened, will be lower than 0.1 degrees relative to the displacement and that it will subsequently reach the positive zero crossing first.
+
+    def __init__(self, coordinator, displacement, kernel=SMOOTHING_KERNEL):
+        """
+        Requires:
+            coordinator (object): detected leg shared with the detector of the other leg (LegCoordinator or sharedVariables.LegDetected)
+            displacement (float): shift of the signal, if high the knee bend should be wider, if low it should be less
+            kernel (tuple, optional): weights of the smoothing filter (see CausalSmoother)
+        """
+        self.coordinator = coordinator
+        self.displacement = displacement
+        self.legDetected = False    #True if this leg has been detected as the step leg
+        self.__peak = 0.0
+        self.__smoother = CausalSmoother(kernel)
+        # Increasing the subtracted value increases detection precision but requires larger step amplitude
+        # Decreasing it compromises accurate detection.
+        self.__crossings = ZeroCrossingTracker(Detector.WINSIZE, -displacement)  #zero crossings of the filtered and shifted window
+        self.__extrema = SlidingExtrema(Detector.WINSIZE)   #extrema of the filtered window
+
+    def push(self, value):
+        """Filters a new sample of the sensor, to be called for every sample"""
+        filtered = self.__smoother.push(value)
+        self.__crossings.push(filtered)
+        self.__extrema.push(filtered)
+
+    def update(self):
+        """
+        Requires:
+            at least WINSIZE samples pushed.
+        Effects:
+            Detection on the window of the last WINSIZE samples pushed.
+            Returns: bool True if this call detected the leg of the sensor as the step leg.
+        """
+        displacement = self.displacement
+        positiveZc = self.__crossings.detect(positive=True)
+        if positiveZc is not None and positiveZc.founded:
+            if self.__peak < - displacement - 0.1:
+                self.__peak = 0.0
+                setted = self.coordinator.set(True)
+                if setted:
+                    self.legDetected = True
+                    return True
+            else:
+                # the minimum of the shifted window is the shifted minimum of the window
+                self.__peak = min(self.__extrema.min() - displacement, self.__peak)
+        return False
+
+################################ STEP DETECTION =======================================================================
+
+class WalkDetector(Detector):
+    """
+        Steps while walking (exType 0)
+    """
+    def __init__(self, params):
+        """params (sensitivity.WalkParameters): parameters of the sensitivity level"""
+        super().__init__()
+        self.__displacement = params.displacement
+        self.__validRange = params.validRange
+        self.__min_threshold = params.min_threshold
+        self.__time_threshold = params.time_threshold # seconds
+        self.__threshold = self.__min_threshold
+        self.__history_sz = 10 #last three steps
+        self.__peakHistory = np.full(self.__history_sz, 5.0, dtype=np.float64) #start with threshold value low to filter noise
+        self.__peak = 0.0
+        self.__swingPhase = False
+        self.__timestamp = None
+        self.__extrema = SlidingExtrema(self.WINSIZE)   #extrema of the window
+        #TEST: subtract a certain angle to trigger sound earlier in the cycle
+        self.__crossings = ZeroCrossingTracker(self.WINSIZE, -self.__displacement)    #zero crossings of the shifted window
+
+    def _start(self, now):
+        self.__timestamp = now
+
+    def _sample(self, value):
+        self.__extrema.push(value)
+        self.__crossings.push(value)
+
+    def _detect(self, now):
+
+        # update peak (only in swing phase : after a positive zero-crossing is encountered
+        # - until the next zero-crossing with negative gradient)
+        # the maximum of the shifted window is the shifted maximum of the window
+        if self.__swingPhase == True:
+            self.__peak = max(self.__peak, self.__extrema.max() - self.__displacement)
+
+        # Zero crossing detection
+        negativeZc = self.__crossings.detect(positive=False)
+
+        if negativeZc is not None and negativeZc.founded:
+            if self.__swingPhase == True:
+                elapsed_time = now - self.__timestamp
+                if self.__peak >= self.__threshold - self.__validRange and elapsed_time > self.__time_threshold:
+                    # a step is valid only if last peak is greater than adaptive threshold
+                    # minus a constant angle to allow angles less than the minimum to be re gistered
+
+                    self.__swingPhase = False #swing phase is set to false only when step is valid
+                    self.__timestamp = now # reset timestamp (new step)
+
+                    # update peak history with last peak
+                    self.__peakHistory[self.movements % self.__history_sz] = self.__peak
+
+                    # new step
+                    self._emit(self.__timestamp)
+
+                    # update threshold
+                    newthresh = np.min(self.__peakHistory)
+                    self.__threshold = newthresh if newthresh > self.__min_threshold else self.__min_threshold # ensure that threshold cannot go below 2.0
+
+                self.__peak = 0.0 #reset peak whenever a zero crossing is encountered (negative gradient)
+        elif negativeZc is not None and not negativeZc.founded: #positiveZc
+            self.__swingPhase = True
+
+################################ MARCH DETECTION ======================================================== && Rob ========
+
+class MarchDetector(Detector):
+    """
+        Steps while walking in place (exType 1, exType 2 with the sensors on the thighs)
+    """
+
+    ### Supports:
+        # - High knees march with ankle sensors
+        # - High knees march with thigh sensors
+        # - Back kicks with ankle sensors
+
+
+    ### ALGORITHM
+
+    #### Approach 1 (FAIL)
+    # - Initially, I tried inverting the signal and looking for peaks with an adaptive threshold. When validating a peak, I searched for the first sample within a range near zero to trigger a sound. Once found, I resumed searching for valid peaks.
+
+    # #### Final Approach
+    # - All three signals have very high peaks (either exclusively positive or negative) and are far from noise, so I do not need a dynamic threshold.
+    # - I shift the signal downwards to mostly negate all noise (this shift acts as a threshold and anticipates zero crossings):
+    #   - A shift of 20 ensures there is no noise.
+    #   - A shift of 10 almost guarantees no noise.
+    #   - A shift of 5 is less certain and less anticipatory, but detects walking with very small steps.
+
+    # - After shifting, I look for opposite zero crossings:
+    #   - Finding a negative zero crossing indicates a peak above the displacement (threshold), making the peak valid and triggering a sound.
+    #   - I then search for a positive zero crossing and return to searching for a negative zero crossing.
+
+    # - The signal has negative peaks so i invert it.
+
+    def __init__(self, params, exType=1):
+        """params (sensitivity.MarchParameters): parameters of the sensitivity level"""
+        super().__init__()
+        self.__exType = exType
+        self.__threshold = params.threshold
+        self.__timeThreshold = 0.1 #seconds (100 ms)
+        self.__swingPhase = False
+        self.__timestamp = None
+        # Window manipulation: the signal is inverted (exType 1) and shifted downwards by the threshold
+        self.__crossings = ZeroCrossingTracker(self.WINSIZE, -self.__threshold, -1.0 if exType == 1 else 1.0)
+
+    def _start(self, now):
+        self.__timestamp = now
+
+    def _sample(self, value):
+        self.__crossings.push(value)
+
+    def _detect(self, now):
+
+        # Zero crossing detection
+        negativeZc = self.__crossings.detect(positive=False)
+        if negativeZc is not None and negativeZc.founded:
+            if self.__swingPhase == True:
+                elapsed_time = now - self.__timestamp
+                if elapsed_time > self.__timeThreshold:
+
+                    # in this case the displacement is sufficient to be also the threshold
+                    # so, a step is valid when we found a zero crossing after a peak value > 0
+
+                    # set swing phase to false until we find a positive zero crossing
+                    self.__swingPhase = False
+                    self.__timestamp = now # reset timestamp (new step)
+                    # new step
+                    self._emit(self.__timestamp)
+
+        elif negativeZc is not None and not negativeZc.founded:
+            # we found positive Zc so we can set swing phase on true
+            self.__swingPhase = True
+
+################################ DOUBLE STEP DETECTION ======================================================== && Rob ========
+
+class SwingDetector(Detector):
+    """
+        Swing (exType 3): the two legs have different signals that therefore need to be distinguished and analyzed differently.
+        The leg is either selected (selectedLeg True for the step leg) or automatically detected with the detector of the other leg.
+    """
+    def __init__(self, params, selectedLeg=None, coordinator=None):
+        """params (sensitivity.SwingParameters): parameters of the sensitivity level"""
+        super().__init__()
+        self.__stepParams = params.step_leg
+        self.__otherParams = params.other_leg
+        self.__selectedLeg = selectedLeg
+        self.__autoDetection = None
+        if coordinator is not None:
+            self.__autoDetection = LegAutoDetection(coordinator, params.leg_detection.displacement)
+        self.__threshold = self.__stepParams.min_peak_threshold
+        self.__gradientThreshold = self.__otherParams.min_gradient_threshold
+        self.__history_sz = 10
+        self.__peakHistory = np.full(self.__history_sz, 5.0, dtype=np.float64)
+        self.__foundedPeak = False
+        self.__pos = True
+        self.__findMininmum = False
+        self.__firstpeak = False
+        self.__previousWindow = None
+        self.__window = None
+        self.__stepBlock = 1    #size of the consecutive blocks of new samples compared by stepLeg
+        self.__blockSamples = 0
+        self.__blockExtrema = SlidingExtrema(self.__stepBlock)  #extrema of the last stepBlock samples
+        self.__crossings = ZeroCrossingTracker(self.WINSIZE, self.__otherParams.displacement)  #zero crossings of the shifted window (otherLeg)
+        self.__timestamp = None
+
+    def _start(self, now):
+        self.__timestamp = now
+
+    def _sample(self, value):
+        self.__blockExtrema.push(value)
+        self.__crossings.push(value)
+        if self.__autoDetection is not None and not self.__autoDetection.coordinator.get(): self.__autoDetection.push(value)
+
+    def _detect(self, now):
+        if self.__autoDetection is not None:
+            # AUTO DETECTION
+            coordinator = self.__autoDetection.coordinator
+            if coordinator.get() == False:
+                if self.__autoDetection.update(): self._emit(now, LEG_DETECTED)
+
+            if coordinator.get() == True :
+                if self.__autoDetection.legDetected == False:
+                    self.otherLeg(now)
+                else:
+                    self.stepLeg(now)
+        else:
+            if self.__selectedLeg is not None:
+                if self.__selectedLeg:
+                    self.stepLeg(now)
+                else:
+                    self.otherLeg(now)
+
+    def _updateWindows(self, block):
+        self.__previousWindow = self.__window
+        self.__window = block
+
+    def stepLeg(self, now):
+
+        # OLD:
+        # The moving leg generates a double positive peak followed by a double negative trough, and so on.
+        # We are only interested when the foot touches the ground, so for each pair, only the first of the two peaks (or troughs) matters.
+        # When I detect a positive peak, I trigger a sound, then look for the second peak. Once found, I switch the search to a negative trough, and vice versa.
+
+        # NEW:
+        # I detect the positive peak, check if it's valid with a dynamic threshold. If within 0.3 seconds there's no positive trough, I trigger a sound.
+        # If I find a positive trough before 0.3 seconds, I trigger a sound.
+        # I look for a new positive peak, once found,
+        # I search for a negative trough, check if it's valid with a dynamic threshold. If within 0.4 seconds there's no negative peak, I trigger a sound.
+        # If I find a negative peak before 0.4 seconds, I trigger a sound.
+        # I look for a new negative trough, once found, repeat the same procedure.
+
+        # Peaks are searched comparing consecutive non-overlapping blocks of new samples (previous, window, pitch):
+        # each sample is processed once, so the block is made of the last stepBlock samples every stepBlock samples.
+        # The comparisons only need the extrema of the blocks, tracked while the samples arrive.
+        self.__blockSamples += 1
+        if self.__blockSamples < self.__stepBlock: return
+        self.__blockSamples = 0
+        block = self.__blockExtrema.extrema()
+
+        # If the first 2 windows haven't arrived yet
+        if self.__previousWindow is None and self.__window is None:
+            self._updateWindows(block)
+            return
+        elif self.__previousWindow is None:
+            self._updateWindows(block)
+            return
+
+        # initialize the windows
+        pitch = block
+        previous = self.__previousWindow
+        window = self.__window
+
+        max_time_wait = 0.4 if not self.__pos else 0.3  # max wait time before play sound
+        displacement = 5 # Only when searching for negative peaks and positive troughs
+        time_threshold = self.__stepParams.time_threshold   # time threshold between peaks
+        min_peak_threshold = self.__stepParams.min_peak_threshold    # Absolute value for positive peaks and negative troughs
+        validRange = self.__stepParams.validRange
+
+        if now - self.__timestamp >= max_time_wait and self.__firstpeak and not self.__foundedPeak:
+            # sound here after a delay (the event keeps the time of the first peak)
+            self._emit(self.__timestamp)
+            self.__foundedPeak = True
+            self.__findMininmum = not self.__findMininmum
+            self._updateWindows(block)
+            self.__timestamp = now
+            return
+
+        # Remove values above or below zero
+        # (shifting and clipping keep the order of the values, so they are applied to the extrema of the blocks)
+        if self.__findMininmum == self.__pos and self.__pos == True:
+            pitch = Extrema(pitch.max + displacement, pitch.min + displacement)               # Shift upwards when looking for positive troughs, to ensure capturing all of them
+            previous = Extrema(previous.max + displacement, previous.min + displacement)      # Conversely, there's no need to shift because moving backwards never reaches zero (risking balance loss)
+            window = Extrema(window.max + displacement, window.min + displacement)
+            pitch, previous, window = clipExtrema(pitch, self.__pos), clipExtrema(previous, self.__pos), clipExtrema(window, self.__pos)
+        else:
+            # the blocks kept for the next comparisons are clipped as well
+            pitch, previous, window = clipExtrema(pitch, self.__pos), clipExtrema(previous, self.__pos), clipExtrema(window, self.__pos)
+            block = pitch
+            self.__window = window
+
+        findedPeak = peakFinder(previous_window=previous, window=window, current_window=pitch, minimum = self.__findMininmum, positive=self.__pos) # if findMininmum is true search mininmum else search peaks, positive indicates if search is on positive or negative part of the plan
+
+        # If a peak or a minimum has been found, check if it is valid
+        if findedPeak:
+            peak = abs(window.max) if not self.__findMininmum else abs(window.min)
+            elapsed_time = now - self.__timestamp
+            thresh = 0 if self.__findMininmum == self.__pos else self.__threshold - validRange
+            if elapsed_time > time_threshold and peak > thresh:
+                self.__timestamp = now
+                if self.__findMininmum != self.__pos:
+                    # update threshold
+                    self.__peakHistory[self.movements % self.__history_sz] = peak
+                    newthresh = np.min(self.__peakHistory)
+                    self.__threshold = newthresh if newthresh > min_peak_threshold else min_peak_threshold
+
+                # findMininmum starts false
+                # firstpeak starts false
+                # pos starts true
+                # foundedPeak starts false
+
+                if not self.__firstpeak :   # if there is no first peak - this is the first
+                    self.__findMininmum = not self.__findMininmum    # set search minimum
+                    self.__firstpeak = True  # set first peak finded
+
+                elif not self.__foundedPeak:   # if there is no interesting peak - this it the interesting peak
+                    self.__foundedPeak = True  # set the interesting peak finded
+                    self.__findMininmum = not self.__findMininmum   # set search peak
+
+                    # sound here could be too late, if it arrives after 0.4 seconds the sound is already reproduced and this part skipped
+                    self._emit(self.__timestamp)
+
+                else:   # if there is the first peak and the interesting peak - this is the last peak
+                    self.__pos = not self.__pos # switch search
+                    self.__findMininmum = not self.__findMininmum   # set search minimum
+                    self.__foundedPeak = False  # reset interesting peak
+                    self.__firstpeak = False    # reset first peak
+
+        # update windows
+        self._updateWindows(block)
+
+    def otherLeg(self, now):
+
+        ## This leg has a sinusoidal-like pattern, so I'm interested in zero crossings.
+        # In this case, however, I'm interested in both zero crossings that occur before and after the peak.
+        # Therefore, I look for a positive zero crossing, trigger a sound,
+        # look for a negative zero crossing, trigger a sound,
+        # and so on...
+
+        # To avoid detecting too sudden zero crossings caused by unexpected rapid changes or
+        # especially by knee bending, I use an adaptive threshold on the gradient (slope) of the zero crossings.
+        # When the slope exceeds the threshold, the zero crossing is not valid.
+
+        displacement1 = self.__otherParams.displacement
+        displacement0 = - displacement1
+        valid_gradient_range = self.__otherParams.valid_gradient_range # to allow the threshold to rise as well
+        time_threshold = self.__otherParams.time_threshold # seconds   # with a high time threshold, we avoid registering Zc due to knee bending
+        min_gradient_threshold = self.__otherParams.min_gradient_threshold
+        alpha = self.__otherParams.alpha
+
+        self.__crossings.shift(displacement0 if not self.__pos else displacement1)
+
+        # Search for positive or negative zero crossing within the threshold
+        positiveZc = self.__crossings.detect(positive = True, maxAbsGradient = self.__gradientThreshold+valid_gradient_range)
+        if positiveZc is not None and ((positiveZc.founded and self.__pos) or (not positiveZc.founded and not self.__pos)):
+            elapsed_time = now - self.__timestamp
+            if elapsed_time > time_threshold:    # If self.__pos is True, I have already found a peak, so the zero crossing is valid
+                self.__pos = not self.__pos     # switch research of zero crossing type
+                self.__timestamp = now  # update time stamp
+                self._emit(self.__timestamp)
+
+                # threshold update
+                self.__gradientThreshold = newGradientThreshold(self.__gradientThreshold, newGradient=positiveZc.absGradient, alpha=alpha, min_value=min_gradient_threshold)
+
+################################ LOAD SHIFT IN TANDEM DETECTION ======================================================== && Rob ========
+
+class TandemDetector(Detector):
+    """
+        Load shift in tandem position (exType 4)
+        The leg is either selected (selectedLeg True for the forward leg) or automatically detected with the detector of the other leg.
+    """
+
+    # The two legs perform different but similar actions.
+    # One leg mostly produces negative angles, and we are interested in detecting when it approaches zero (or positive zero crossings).
+    # The other leg mostly produces positive angles, and we are interested in detecting when it approaches zero (or negative zero crossings).
+    # Whether starting with the leg moving forward or backward, the forward leg is the first to reach a positive zero crossing.
+    # Therefore, I use the same method as the swing for recognition.
+
+    def __init__(self, params, selectedLeg=None, coordinator=None):
+        """params (sensitivity.TandemParameters): parameters of the sensitivity level"""
+        super().__init__()
+        self.__params = params
+        self.__selectedLeg = selectedLeg
+        self.__autoDetection = None
+        if coordinator is not None:
+            self.__autoDetection = LegAutoDetection(coordinator, params.leg_detection.displacement)
+        self.__gradientThreshold = self.__params.min_gradient_threshold
+        displacement = params.displacement1 if selectedLeg is False else params.displacement0
+        self.__crossings = ZeroCrossingTracker(self.WINSIZE, displacement)    #zero crossings of the shifted window
+        self.__timestamp = None
+
+    def _start(self, now):
+        self.__timestamp = now
+
+    def _sample(self, value):
+        self.__crossings.push(value)
+        if self.__autoDetection is not None and not self.__autoDetection.coordinator.get(): self.__autoDetection.push(value)
+
+    def _detect(self, now):
+        if self.__autoDetection is not None:
+            # AUTO DETECTION
+            coordinator = self.__autoDetection.coordinator
+            if coordinator.get() == False:
+                if self.__autoDetection.update(): self._emit(now, LEG_DETECTED)
+
+            if coordinator.get() == True :
+                self.tandemFunction(now, forward=self.__autoDetection.legDetected)
+        else:
+            if self.__selectedLeg is not None:
+                # self.__selectedLeg = True if the front leg is the right one, False if it's the left one
+                self.tandemFunction(now, forward=self.__selectedLeg)
+
+    # Negative angles might proportionally be lower than positive ones, so different shifts should be adopted.
+    # The difference in shifts is determined by the angles typically made by the feet, which usually vary.
+    # The back foot points outward, while the front foot points forward.
+
+    # The problem of knee bending remains can be addressed with the gradient threshold.
+
+    def tandemFunction(self, now, forward = True):
+
+        # Backward leg:
+        # Peaks are almost always above -10 (15) and troughs almost always below -10 (15).
+        # Forward leg:
+        # Peaks are almost always above 10 and troughs almost always below 10.
+
+        # This allows me to shift the signals by 10° and -10° respectively.
+
+        # standard values
+        displacement0 = self.__params.displacement0  # -10 for the front leg since it makes positive angles that descend to 0
+        displacement1 = self.__params.displacement1  # 15 for the back leg since it makes negative angles that rise close to -5
+        valid_gradient_range = self.__params.valid_gradient_range  # to allow the threshold to rise as well
+        time_threshold = self.__params.time_threshold  # seconds   # with a high time threshold, we avoid registering Zc due to knee bending
+        min_gradient_threshold = self.__params.min_gradient_threshold
+        alpha = self.__params.alpha
+
+        self.__crossings.shift(displacement0 if forward else displacement1)
+
+        # Zero crossing search
+        positiveZc = self.__crossings.detect(positive = True, maxAbsGradient = self.__gradientThreshold+valid_gradient_range)
+        if positiveZc is not None and (positiveZc.founded != forward):
+            elapsed_time = now - self.__timestamp
+            if elapsed_time > time_threshold:    # If self.__pos is True, I have already found a peak, so the zero crossing is valid
+                self.__timestamp = now  # update time stamp
+                self._emit(self.__timestamp)
+
+                # threshold update
+                self.__gradientThreshold = newGradientThreshold(self.__gradientThreshold, newGradient=positiveZc.absGradient, alpha=alpha, min_value=min_gradient_threshold)
+
+################################ FACTORY ======================================================== && Rob ========
+
+def createDetector(exType, parameters, selectedLeg=None, coordinator=None):
+    """
+    Requires:
+        exType (int): exercise type
+            0 --> walking
+            1 --> Walking in place and Marching
+            2 --> Walking in place (with sensors on the thighs)
+            3 --> Swing
+            4 --> Load shift in tandem position
+        parameters (sensitivity.SensitivityLevel): parameters of the exercises for the level of sensitivity
+                                                   (see sensitivity.sensitivityLevel)
+        selectedLeg (bool, optional): True if the sensor is on the step (forward) leg, False otherwise (exType 3 and 4)
+        coordinator (object, optional): detected leg shared with the detector of the other leg, enables the automatic
+                                        detection of the leg instead of selectedLeg (exType 3 and 4)
+    Effects:
+        Returns: the detector of the exercise, None if the exercise type is not supported.
+    """
+    if exType == 0: return WalkDetector(parameters.walk)
+    if exType == 1 or exType == 2: return MarchDetector(parameters.march, exType)
+    if exType == 3: return SwingDetector(parameters.swing, selectedLeg, coordinator)
+    if exType == 4: return TandemDetector(parameters.tandem, selectedLeg, coordinator)
+    return None
@@ -50,32 +50,38 @@
 #  OF ARBITRATION OF THE INTERNATIONAL CHAMBER OF COMMERCE IN THE HAGUE BY ONE OR MORE 
 #  ARBITRATORS APPOINTED IN ACCORDANCE WITH SAID RULES.
 
-import sys
 import time
-import os
-import gc
+import atexit
 import xsensdeviceapi as xda
-import multiprocessing as mp
 import numpy as np
-from multiprocessing.sharedctypes import RawValue, RawArray
 from threading import Lock
-from plotter import Plotter
-from analyzer import Analyzer
-from sharedVariables import SharedCircularIndex
-from sharedVariables import LegDetected
-from sharedVariables import ProcessWaiting
-from sharedVariables import SharedData
-import platform
+from recorder import Recorder
+from sensorRecords import recordDtype
 
 
 class MtwCallback(xda.XsCallback):
-    def __init__(self, m_mtwIndex, device, max_buffer_size = 300):
+    """Per-device callback buffering the samples produced by one MTw
+
+    Samples are stored in a fixed-capacity ring of preallocated record slots
+    (see sensorRecords) with single-producer/single-consumer semantics:
+    the SDK thread only advances the write counter and the acquisition loop
+    only advances the read counter, so no lock is needed. Only the consumed
+    fields are decoded, the XsDataPacket is never copied.
+    When the ring is full the incoming sample is dropped and counted.
+    """
+    def __init__(self, m_mtwIndex, device, max_buffer_size = 300, inertial = False):
         xda.XsCallback.__init__(self)
         self.m_mtwIndex = m_mtwIndex
         self.m_device = device
         self.m_maxNumberOfPacketsInBuffer = max_buffer_size
-        self.m_packetBuffer = list()
-        self.m_lock = Lock()
+        self.m_inertial = inertial
+        self.m_recordBuffer = np.zeros(max_buffer_size, dtype=recordDtype(inertial))
+        self.m_writeCount = 0     # written by the SDK thread only
+        self.m_readCount = 0      # written by the consumer only
+        self.m_overflowCount = 0  # samples dropped because the ring was full
+        self.m_directWriter = None  # if set, records are handed to it instead of being buffered
+        self.m_directBusy = False   # True while the SDK thread is inside the direct writer
+        self.m_writerErrors = 0     # records the direct writer failed to write
 
     def getMtwIndex(self):
         return self.m_mtwIndex
@@ -85,28 +91,76 @@ class MtwCallback(xda.XsCallback):
         return self.m_device
 
     def dataAvailable(self):
-        self.m_lock.acquire()
-        if self.m_packetBuffer:
-            res = True
+        return self.m_writeCount != self.m_readCount
+
+    def getOverflowCount(self):
+        return self.m_overflowCount
+
+    def getWriterErrorCount(self):
+        return self.m_writerErrors
+
+    def drainSamples(self):
+        """Return every pending record as one contiguous block (oldest first) and free their slots"""
+        readCount = self.m_readCount
+        count = self.m_writeCount - readCount #records written after this snapshot are left for the next call
+        start = readCount % self.m_maxNumberOfPacketsInBuffer
+        end = start + count
+        if end <= self.m_maxNumberOfPacketsInBuffer:
+            records = self.m_recordBuffer[start:end].copy()
         else:
-            res = False
-        self.m_lock.release()
-        return res
-
-    def getOldestPacket(self):
-        self.m_lock.acquire()
-        assert(len(self.m_packetBuffer) > 0)
-        oldest_packet = xda.XsDataPacket(self.m_packetBuffer.pop(0))
-        self.m_lock.release()
-        return oldest_packet
+            records = np.concatenate((self.m_recordBuffer[start:], self.m_recordBuffer[:end - self.m_maxNumberOfPacketsInBuffer]))
+        self.m_readCount = readCount + count
+        return records
+
+    def decodePacket(self, packet):
+        """Extract the recorded fields from an XsDataPacket as a record tuple"""
+        #packet always contains orientation NO NEED TO CHECK (Mtw Awinda)
+        euler = packet.orientationEuler()
+        if packet.containsSampleTimeFine():
+            timestamp = packet.sampleTimeFine() * 1e-4 #sample time fine is expressed in units of 100 us
+        else:
+            timestamp = packet.timeOfArrival().msTime() * 1e-3
+        record = (packet.packetCounter(), timestamp, euler.x(), euler.y(), euler.z())
+        if self.m_inertial:
+            nan3 = (np.nan, np.nan, np.nan)
+            gyr = packet.calibratedGyroscopeData() if packet.containsCalibratedGyroscopeData() else None
+            acc = packet.calibratedAcceleration() if packet.containsCalibratedAcceleration() else None
+            record += ((gyr[0], gyr[1], gyr[2]) if gyr is not None else nan3,
+                       (acc[0], acc[1], acc[2]) if acc is not None else nan3)
+        return record
+
+    def setDirectWriter(self, writer):
+        """Hand every new record to writer (called on the SDK thread) instead of buffering it
+
+        writer=None restores buffering and returns only once the SDK thread has left the previous writer,
+        so that nothing else is written by it after this call
+        """
+        self.m_directWriter = writer
+        if writer is None:
+            while self.m_directBusy:
+                xda.msleep(1)
 
     def onLiveDataAvailable(self, dev, packet):
-        self.m_lock.acquire()
         assert(packet != 0)
-        while len(self.m_packetBuffer) >= self.m_maxNumberOfPacketsInBuffer:
-            self.m_packetBuffer.pop() #queue is full get rid of last element 
-        self.m_packetBuffer.append(xda.XsDataPacket(packet))
-        self.m_lock.release()
+        self.m_directBusy = True
+        writer = self.m_directWriter
+        if writer is not None:
+            try:
+                writer(self.decodePacket(packet))
+            except Exception as error:
+                #the error must not leave the SDK thread, the record is lost and counted
+                self.m_writerErrors += 1
+                if self.m_writerErrors == 1: print("MTW {}: direct writer failed: {}".format(self.m_mtwIndex, error))
+            finally:
+                self.m_directBusy = False   #setDirectWriter(None) waits for this flag
+            return
+        self.m_directBusy = False
+        if self.m_writeCount - self.m_readCount >= self.m_maxNumberOfPacketsInBuffer:
+            self.m_overflowCount += 1 #ring is full, drop the incoming sample
+            return
+        #the whole record is written into the slot with a single assignment
+        self.m_recordBuffer[self.m_writeCount % self.m_maxNumberOfPacketsInBuffer] = self.decodePacket(packet)
+        self.m_writeCount += 1 #publish the slot only after it has been written
 
 class WirelessMasterCallback(xda.XsCallback):
     def __init__(self, stop_recording = None):
@@ -163,30 +217,52 @@ class NoDongleException(RuntimeError):
     def __init__(self, msg):
         super().__init__(msg)
 
-class MtwAwinda(object):
+class MtwAwinda(Recorder):
     """Class that allows mtwAwinda devices handling
     
     must be used in a with block to properly initialize and close devices
     desiredUpdaterate and desiredRadioChannel are mandatory arguments to the constructor
     (see device documentation for a list of supported update rates and radio channels)
+    numberOfMtws is the number of MTw devices that must be connected before starting (default 2, one for each leg)
+    if inertial=True calibrated gyroscope and acceleration are recorded together with the orientation
+    the recording (mtwRecord) is implemented by Recorder, this class only handles the devices
+    if persistent=True the devices are not released at the end of the with block: the master stays
+    in measurement mode and the next with block (with the same configuration) reuses the session,
+    so that a recording only has to be armed. The session is released by clean() (or at exit)
     """
-    def __new__(cls, desiredUpdateRate, desiredRadioChannel, samplesPath):
+    def __new__(cls, desiredUpdateRate, desiredRadioChannel, samplesPath, numberOfMtws=2, inertial=False, persistent=False):
         if not hasattr(cls, 'instance'):
             cls.instance = super(MtwAwinda, cls).__new__(cls)
         return cls.instance
     
-    def __init__(self, desiredUpdateRate:int, desiredRadioChannel:int, samplesPath:str = ""):
-        self.__updateRate = desiredUpdateRate
+    def __init__(self, desiredUpdateRate:int, desiredRadioChannel:int, samplesPath:str = "", numberOfMtws:int = 2, inertial:bool = False, persistent:bool = False):
+        if getattr(self, "_MtwAwinda__connected", False):
+            if (desiredUpdateRate, desiredRadioChannel, numberOfMtws, inertial) == (self.getUpdateRate(), self.__radioChannel, self.getNumberOfMtws(), self.__inertial):
+                #open session with the same configuration: keep it
+                self.setSamplesPath(samplesPath)
+                self.__persistent = persistent
+                return
+            self.__clean()
+        super().__init__(desiredUpdateRate, samplesPath, numberOfMtws, inertial)
         self.__radioChannel = desiredRadioChannel
-        self.__samplesPath = samplesPath
-        self.__maxNumberofCoords = 72000 #equivalent to 10 minutes at 120Hz
-        self.__eulerData = np.zeros((2, self.__maxNumberofCoords), dtype=np.float64) #we have only two Mtw devices
-        self.__index = np.zeros(2, dtype=np.uint32)
-        self.__recordingStopped = False
+        self.__inertial = inertial
+        self.__persistent = persistent
+        self.__connected = False
         self.__cleanCalled = False
+        self.__overflowBase = [0] * numberOfMtws
+        if persistent and not getattr(self, "_MtwAwinda__atexitRegistered", False):
+            atexit.register(self.__closeSession)
+            self.__atexitRegistered = True
 
 
     def __enter__(self):
+        if self.__connected:
+            if len(self.masterCallback.getWirelessMTWs()) >= self.getNumberOfMtws():
+                print("Reusing open session")
+                return self
+            print("Session lost some MTWs, reconnecting...")
+            self.__clean()
+        self.__cleanCalled = False
         print("Creating XsControl object...")
         self.control = xda.XsControl_construct()
         assert(self.control != 0)
@@ -239,8 +315,8 @@ class MtwAwinda(object):
             for rate in rates:
                 print("%d " % (rate))
 
-            print("Setting update rate to %d Hz..." % self.__updateRate)
-            if not self.masterDevice.setUpdateRate(self.__updateRate):
+            print("Setting update rate to %d Hz..." % self.getUpdateRate())
+            if not self.masterDevice.setUpdateRate(self.getUpdateRate()):
                 raise RuntimeError("Could not set desired update rate. Aborting")
             
             print("Disabling radio channel if previously enabled...")
@@ -255,7 +331,7 @@ class MtwAwinda(object):
             print("Waiting for MTWs to wirelessly connect...")
             time0 = time.time()
             self.connectedMTWCount = len(self.masterCallback.getWirelessMTWs())
-            while self.connectedMTWCount < 2:
+            while self.connectedMTWCount < self.getNumberOfMtws():
                 xda.msleep(100)
                 if (time.time() - time0) > 30: raise RuntimeError("There have been communication issues between the USB dongle and the sensors. If necessary, moving or restarting the sensors.")
                 while True:
@@ -273,6 +349,7 @@ class MtwAwinda(object):
             for dev in allDeviceIds:
                 if dev.isMtw():
                     mtwDeviceIds.append(dev)
+            mtwDeviceIds = mtwDeviceIds[:self.getNumberOfMtws()] #only the requested number of devices is recorded
             self.mtwDevices = list()
             for dev in mtwDeviceIds:
                 mtwDevice = self.control.device(dev) #XsDevice object
@@ -284,7 +361,7 @@ class MtwAwinda(object):
             print("Attaching callback handlers to MTWs...")
             self.mtwCallbacks = list()
             for i in range(len(self.mtwDevices)):
-                self.mtwCallbacks.append(MtwCallback(i, self.mtwDevices[i]))
+                self.mtwCallbacks.append(MtwCallback(i, self.mtwDevices[i], inertial=self.__inertial))
                 self.mtwDevices[i].addCallbackHandler(self.mtwCallbacks[i])
                 print("Created callback %s and attached to device %s" % 
                       (self.mtwCallbacks[i].getMtwIndex(), self.mtwCallbacks[i].device().deviceId().toXsString()))
@@ -294,6 +371,7 @@ class MtwAwinda(object):
             if not self.masterDevice.gotoMeasurement():
                 raise RuntimeError("Could not put device into measurement mode. Aborting.")
 
+            self.__connected = True
             return self
 
         except (Exception) as error:
@@ -305,70 +383,7 @@ class MtwAwinda(object):
         # else:
         #     print("Successful init.")
     
-    def __getEuler(self):
-        """Get data from callback buffers, 
-        
-        returns a list of two bools one for each buffer
-        the corresponding element is True if data was available, False otherwise
-        
-        Has to consume data faster than it is produced otherwise data is lost
-        (buffersize is 300 packets for each device)
-        """
-
-        avail = [False, False]
-        try:
-    
-            for i in range(2):
-                if self.mtwCallbacks[i].dataAvailable():
-                    # print(f"lenght_of_buffer: {len(self.mtwCallbacks[i].m_packetBuffer)}")
-                    avail[i] = True
-                    # Retrieve a packet
-                    packet = self.mtwCallbacks[i].getOldestPacket()
-                    #packet always contains orientation NO NEED TO CHECK (Mtw Awinda)
-                    euler = packet.orientationEuler()
-                    self.__eulerData[i][self.__index[i]] = euler.y() #pitch only is written into the class buffer
-                    self.__index[i] += 1 % self.__maxNumberofCoords
-
-            return avail
-    
-        except (Exception) as error:
-            print(error)
-            self.__clean()
-            raise error
-            # sys.exit(1)
-
-    def __cleanBuffer(self):
-        self.__eulerData = np.zeros((2, self.__maxNumberofCoords), dtype=np.float64)
-        self.__index = np.zeros(2, dtype=np.uint32)
-
-    def __loadSamples(self, loadSamples=True):
-        if not loadSamples: return None
-        #check if sample list is empty before returning
-        try:
-            files = [os.path.join(self.__samplesPath, f) for f in os.listdir(self.__samplesPath) 
-                    if os.path.isfile(os.path.join(self.__samplesPath, f))]
-            files.sort() #sort filenames in order
-            samples = []
-            print("loading wave samples...")
-            for f in files:
-                if f.lower().endswith((".wav", ".mp3")):
-                # if f.lower().endswith(".wav"):
-                    # samples.append(sa.WaveObject.from_wave_file(f))
-                    samples.append(f)
-            if len(samples) == 0:
-                print("No wav or mp3 file was found at given pathname...Aborting. Check file extensions")
-                raise Exception("No wav or mp3 file was found at given pathname.")        
-        except:
-            print("samples could not be loaded...Aborting. Check pathname syntax")
-            self.__clean()
-            raise Exception("samples could not be loaded.")
-            # sys.exit(1)
-        else:
-            print("...samples loaded successfully")
-
-        return samples 
-
-    def __resetOrientation(self):
+    def _resetOrientation(self):
         try:
             #RESET ORIENTATION
             print("Scheduling Orientation reset...")
@@ -386,193 +401,33 @@ class MtwAwinda(object):
     def mtwCalibrate():
         pass
 
-    def mtwRecord(self, duration:float, plot:bool=False, analyze:bool=True, exType:int=0, sensitivityLev:int=3, auto_detectLegs:bool=True, selectedLeg:bool=None, calculateBpm:bool=False, shared_data:object=None, setStart:callable=None, sound:bool=True):
-        """Record pitch data for duration seconds
-        
-        Returns a numpy.array object containing the data for each device and the relative index, and interesting points bidimensional array of indexes
-        Additional flags can be supplied:
-
-        if plot=True it spawns a daemon that handles plotting
-        if analyze=True (default) it spawns a daemon that performs step counting
-        exType defines the type of analysis to be performed
-        if auto_detectLegs = True it automatically detect backward and forward legs
-        sensitivityLev is a level of sensitivity in range 1 to 5
-        """
-        try:
-            if not isinstance(duration, int) or duration <= 10:
-                raise ValueError("duration must be a positive integer (> 10) indicating the number of seconds")
-            
-            def write_shared(data0, data1, index0, index1, coords, terminate=False):
-                #write coordinates to shared memory
-                if terminate:
-                    data0[index0.value] = 1000
-                    data1[index1.value] = 1000
-                else:
-                    #coords contains pitch for both dx and sx sensors
-                    if coords[0] != 0:
-                        data0[index0.value] = coords[0]
-                        index0.value = (index0.value + 1) % 1000
-                    if coords[1] != 0:
-                        data1[index1.value] = coords[1]
-                        index1.value = (index1.value + 1) % 1000
-
-            self.__cleanBuffer()
-
-            if shared_data is None:
-                # print("in mtw shared data is none")
-                #Declare and initialize unsynchronized shared memory (not lock protected)
-                shared_data = SharedData()
-
-            interestingPoints0 = RawArray('d', 1000)
-            interestingPoints1 = RawArray('d', 1000)
-
-            betweenStepsTimes0 = RawArray('d', 1000)
-            betweenStepsTimes1 = RawArray('d', 1000)
-
-            if any((plot, analyze)):
-
-                if plot:
-                    plotter = Plotter()
-                    plotter_process = mp.Process(target=plotter, args=(shared_data.data0, shared_data.data1, shared_data.index0, shared_data.index1), daemon=True)
-                    plotter_process.start()
-                    
-                if analyze:
-                    #samples are loaded only if analyzer is has to spawn
-                    samples = self.__loadSamples(sound)
-                    if samples is not None: sharedIndex = SharedCircularIndex(len(samples))
-                    else: sharedIndex = None
-                    analyzer0 = Analyzer()
-                    analyzer1 = Analyzer()
-                    sharedLegBool = LegDetected() 
-                    sharedSyncronizer = ProcessWaiting()
-                    # First id device assumed as right leg, is related with data0, so with analyzer_process0
-                    # Second id device assumed as left leg is related with data1, so with analyzer_process1
-                    analyzer_process0 = mp.Process(target=analyzer0, name="analyzer0", args=(shared_data.data0, shared_data.index0, 0, sharedIndex, samples, exType, sensitivityLev, auto_detectLegs, selectedLeg, sharedLegBool, sharedSyncronizer.start, interestingPoints0, betweenStepsTimes0, calculateBpm, sound), daemon=True)
-                    analyzer_process1 = mp.Process(target=analyzer1, name="analyzer1", args=(shared_data.data1, shared_data.index1, 1, sharedIndex, samples, exType, sensitivityLev, auto_detectLegs, not selectedLeg, sharedLegBool, sharedSyncronizer.start, interestingPoints1, betweenStepsTimes1, calculateBpm, sound), daemon=True)
-                    analyzer_process0.start()
-                    analyzer_process1.start()
-                    #delete local version of samples 
-                    # del samples
-                    # gc.collect()
-                
-                time.sleep(1) #wait one second before starting orientation reset and to allow processes to properly start
-                time.sleep(2)
-                self.__resetOrientation()
-
-                try:
-                    if setStart is not None: setStart()
-                except:
-                    raise RuntimeError("Impossible to call setStart function")
-                
-                print("Recording started..." + str(time.time()))
-                os = platform.system()
-
-                startTime = xda.XsTimeStamp_nowMs()
-                prev_data_time = time.time()
-                prev_data = None
-                while xda.XsTimeStamp_nowMs() - startTime <= 1000*duration:
-                    if self.__recordingStopped:
-                        # self.__recordingStopped = False 
-                        if analyze:
-                            if analyzer_process0.is_alive(): analyzer_process0.terminate()
-                            if analyzer_process1.is_alive(): analyzer_process1.terminate()
-                        if plot and plotter_process.is_alive(): plotter_process.terminate()
-                        # self.__clean()
-                        # break
-                        return None
-                    avail = self.__getEuler()
-
-                    # if there are the same data related of a sensor for 6 seconds, the sensor is unavailable, raise exception
-                    if time.time()-prev_data_time >= 6:
-                        prev_data_time = time.time()
-                        if prev_data is not None:
-                            coords = [self.__eulerData[0][self.__index[0]-1], self.__eulerData[1][self.__index[1]-1]]
-                            if prev_data[0] == coords[0] or prev_data[1] == coords[1]:
-                                raise Exception("Error: Unable to record both sensors data, one of the sensors failed. Please retry and if necessary reboot the sensors.")
-                        prev_data = [self.__eulerData[0][self.__index[0]-1], self.__eulerData[1][self.__index[1]-1]]
-
-                    if any(avail):
-                        # print("new data available at time: " + str(time.time()))
-                        coords = [self.__eulerData[0][self.__index[0]-1], self.__eulerData[1][self.__index[1]-1]]
-                        coords = [a*b for a,b in zip(coords,avail)] #send only new data
-                        write_shared(shared_data.data0, shared_data.data1, shared_data.index0, shared_data.index1, coords)
-                    #allow other processes to run
-                    #sleep 3ms (a new packet is received roughly every 8.33ms)
-                    
-                    xda.msleep(0) if os =="Windows" else xda.msleep(3)
-
-                write_shared(shared_data.data0, shared_data.data1, shared_data.index0, shared_data.index1, None, terminate=True)
-                
-                # if not self.__recordingStopped:
-                if plot:
-                    plotter_process.join()
-                if analyze:
-                    analyzer_process0.join()
-                    analyzer_process1.join()
-                    #result of step counting is written into shared memory
-                    print("Total number of steps: {:d}".format(int(shared_data.data0[shared_data.index0.value-1]) + int(shared_data.data1[shared_data.index1.value-1])))
+    def _arm(self):
+        """Discard the samples received since the last recording"""
+        for callback in self.mtwCallbacks:
+            callback.drainSamples()
+        self.__overflowBase = [callback.getOverflowCount() for callback in self.mtwCallbacks]
 
+    def _drain(self, i):
+        return self.mtwCallbacks[i].drainSamples()
+
+    def _setDirectWriters(self, writers):
+        """Switch every device callback to event driven acquisition (writers=None restores buffering)"""
+        for i, callback in enumerate(getattr(self, "mtwCallbacks", [])):
+            if writers is None:
+                callback.setDirectWriter(None)
             else:
-                #record the data and return it without analisys
-                startTime = xda.XsTimeStamp_nowMs()
-                while xda.XsTimeStamp_nowMs() - startTime <= 1000*duration:
-                    _ = self.__getEuler() #fills object buffer with data from Mtw devices
-
-            # clean raw arrays from data after termination value
-            def extractData(rawArray):
-                array = []
-                for data in rawArray:
-                    if data != (-2000):  # end value
-                        array.append(data)
-                    else:
-                        break
-                return np.array(array)
-            
-            def removeOutliers(np_arr):
-                # Z score method
-                if np_arr.size == 0: return np_arr
-
-                print(np_arr)
-                mean_elapsed_time = np.mean(np_arr) # mean
-                std_dev_elapsed_time = np.std(np_arr)   # standard deviation
-                if std_dev_elapsed_time == 0 or np.isnan(std_dev_elapsed_time): return np_arr
-
-                z_scores = [(time - mean_elapsed_time) / std_dev_elapsed_time for time in np_arr]
-                z_score_threshold = 3
-                outliers_indices = [i for i, z_score in enumerate(z_scores) if abs(z_score) > z_score_threshold]
-                filtered_elapsed_times = np.delete(np_arr, outliers_indices)
-                print(filtered_elapsed_times)
-                if filtered_elapsed_times.size == 0: return np_arr
-
-                return filtered_elapsed_times
-
-            if analyze:
-                # create bidimentional array of interesting points
-                points0 = extractData(interestingPoints0)
-                points1 = extractData(interestingPoints1)
-                interestingPoints = [points0, points1]      
-
-                if calculateBpm:
-                    # convert timestamps to bpm value
-                    times0 = np.concatenate((extractData(betweenStepsTimes0), extractData(betweenStepsTimes1)))
-                    if times0.size != 0:
-                        elapsed_times = removeOutliers(np.diff(np.sort(times0))) # sort, calculate differences, remove outliers by z-score
-                        if elapsed_times.size != 0:
-                            mediumTimeValue = np.mean(elapsed_times) / 60 # Mean in minutes
-                            bpmTimeValue = 1 / mediumTimeValue if mediumTimeValue != 0 else False   # Calculate bpm
-                        else: bpmTimeValue = False
-                    else: bpmTimeValue = False
-                else: bpmTimeValue = False
-
-                return (self.__eulerData, self.__index, interestingPoints, bpmTimeValue)
-            return (self.__eulerData, self.__index, [[],[]], False)
-    
-        except (Exception) as error:
-            print(error)
-            self.__clean()
-            raise error
-            # sys.exit(1)
-    
+                callback.drainSamples() #discard samples buffered before the start of the recording
+                callback.setDirectWriter(writers[i])
+
+    def _nowMs(self):
+        return xda.XsTimeStamp_nowMs()
+
+    def _sleep(self, ms):
+        xda.msleep(ms)
+
+    def _clean(self):
+        self.__clean()
+
     def __clean(self, exception = None):
         if self.__cleanCalled: return
         print("CLEAN CALLED")
@@ -603,14 +458,18 @@ class MtwAwinda(object):
         else:
             print("Successful clean")
             self.__cleanCalled = True
+            self.__connected = False
 
-    def stopRecording(self):
-        self.__recordingStopped = True
+    def __closeSession(self):
+        if self.__connected: self.__clean()
 
-    def clean(self):
-        self.__clean()
+    def getOverflowCounts(self):
+        """Number of samples dropped by each device callback because its ring was full"""
+        return [callback.getOverflowCount() - base for callback, base in zip(self.mtwCallbacks, self.__overflowBase)]
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         print("EXIT CALLED")
+        if self.__persistent and exc_type is None and self.__connected:
+            print("Session kept open")
+            return
         self.__clean()
-             
\ No newline at end of file
@@ -23,7 +23,6 @@
 import matplotlib.pyplot as plt
 import matplotlib.animation as animation
 import matplotlib.style as mplstyle
-import numpy as np
 
 class Plotter():
     def __terminate(self):
@@ -33,26 +32,25 @@ class Plotter():
         plt.close(self.__fig)
     
     def __animate(self, i):
-        if self.__data0[self.__index0.value] == 1000:
+        if not self.__control.isRunning():
             self.__terminate()
             return
 
-        pitch0 = np.array(self.__data0)
-        pitch1 = np.array(self.__data1)
-
         self.__ax.clear()
-        l0, = self.__ax.plot(self.__data0, 'b')
-        l1, = self.__ax.plot(self.__data1, 'c')
-        return l0, l1
+        lines = []
+        for n, ring in enumerate(self.__rings):
+            l, = self.__ax.plot(ring.latest(ring.capacity), self.__colors[n % len(self.__colors)])
+            lines.append(l)
+        return lines
     
-    def __call__(self, data0, data1, index0, index1):
+    def __call__(self, rings, control, ready=None):
         print('starting plotter daemon..')
         mplstyle.use('fast')
-        self.__data0 = data0
-        self.__data1 = data1
-        self.__index0 = index0 
-        self.__index1 = index1
+        self.__rings = rings    #list of shared rings, one for each sensor
+        self.__control = control    #control block of the recording
+        self.__colors = ['b', 'c', 'g', 'm', 'y', 'k']
         self.__fig, self.__ax = plt.subplots()
         self.__ani = animation.FuncAnimation(self.__fig, self.__animate, interval=50, cache_frame_data=False, blit=True, repeat=False)
         print('...plotter daemon started')
+        if ready is not None: ready()   #readiness signal (see ProcessWaiting)
         plt.show()
\ No newline at end of file
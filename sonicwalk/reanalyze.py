@@ -0,0 +1,217 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Re-analysis of the archive of recordings saved by the GUI (<archive>/<patient>/<session>/<exercise>_*.csv)
+# with the batch analyzer, spread over a pool of processes.
+# The results are written to a csv table; a manifest next to it keeps the content hash of every recording
+# and the configuration of the analysis, so that the recordings not changed since the last run
+# (same content, detector version, sensitivity parameters and options) are not analyzed again.
+#
+#   python sonicwalk/reanalyze.py GUI/data/archive -o reanalysis.csv
+
+import os
+import csv
+import json
+import time
+import hashlib
+import argparse
+import multiprocessing as mp
+import numpy as np
+from sensorRecords import readRecording
+from detectors import DETECTOR_VERSION
+from sensitivity import sensitivityLevel
+from batch import analyzeRecording, movementIndices, estimateBpm
+
+# exercise type of the recordings from the prefix of the file name (see GUI recordingFrame.saveRecording)
+EXERCISE_PREFIXES = {
+    "walk_": 0,
+    "marchHight_": 1,
+    "marchButt_": 2,
+    "swing_": 3,
+    "loadShift_tandem_": 4,
+}
+
+COLUMNS = ["path", "patient", "session", "exercise", "exType", "Fs", "samples", "duration",
+           "steps", "stepsPerSensor", "bpm", "cadence", "error"]
+
+def exerciseType(path):
+    """
+    Effects:
+        Returns: tuple (exercise name, exercise type) inferred from the file name of the recording,
+                 (None, None) if the prefix is unknown.
+    """
+    name = os.path.basename(path)
+    for prefix in sorted(EXERCISE_PREFIXES, key=len, reverse=True):
+        if name.startswith(prefix): return prefix[:-1], EXERCISE_PREFIXES[prefix]
+    return None, None
+
+def discoverRecordings(root):
+    """
+    Effects:
+        Returns: sorted list of the csv files under root whose exercise type is known.
+    """
+    found = []
+    for directory, _, files in os.walk(root):
+        for name in files:
+            if name.endswith(".csv") and exerciseType(name)[1] is not None:
+                found.append(os.path.join(directory, name))
+    return sorted(found)
+
+def fileHash(path):
+    """sha256 of the content of the file at path"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def configurationKey(parameters, sensitivity, selectedLeg, auto_detectLegs):
+    """
+    Effects:
+        Returns: string identifying the configuration of the analysis (detector version, sensitivity parameters
+                 and options), a recording is analyzed again if it changes.
+    """
+    configuration = json.dumps([DETECTOR_VERSION, repr(parameters), sensitivity, selectedLeg, auto_detectLegs])
+    return hashlib.sha256(configuration.encode()).hexdigest()
+
+def analyzeFile(task):
+    """
+    Requires:
+        task (tuple): (path, root, parameters, sensitivity, selectedLeg, auto_detectLegs)
+    Effects:
+        Returns: the row of the results table of the recording at path (error holds the message if it failed).
+        Target of the processes of the pool.
+    """
+    path, root, parameters, sensitivity, selectedLeg, auto_detectLegs = task
+    exercise, exType = exerciseType(path)
+    relative = os.path.relpath(path, root)
+    parts = relative.split(os.sep)
+    row = dict.fromkeys(COLUMNS, "")
+    row.update(path=relative, exercise=exercise, exType=exType,
+               patient=parts[0] if len(parts) > 2 else "", session=parts[1] if len(parts) > 2 else "")
+    try:
+        signals, Fs = readRecording(path)
+        events = analyzeRecording(signals, Fs, exType, sensitivity, selectedLeg, auto_detectLegs, parameters)
+        steps = [movementIndices(e) for e in events]
+        duration = signals.shape[1] / Fs
+        total = sum(s.size for s in steps)
+        bpm = estimateBpm(np.concatenate(steps) / Fs)
+        row.update(Fs=Fs, samples=signals.shape[1], duration=round(duration, 3), steps=total,
+                   stepsPerSensor=" ".join(str(s.size) for s in steps),
+                   bpm=round(bpm, 2) if bpm is not False else "",
+                   cadence=round(60 * total / duration, 2) if duration > 0 else "")
+    except Exception as e:
+        row["error"] = "{}: {}".format(type(e).__name__, e)
+    return row
+
+def loadManifest(path):
+    if not os.path.exists(path): return {}
+    try:
+        with open(path, 'r') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        print("Invalid manifest {}, all the recordings are analyzed again".format(path))
+        return {}
+
+def reanalyze(root, output, manifestPath=None, sensitivity=3, selectedLeg=None, auto_detectLegs=True, processes=None, force=False):
+    """
+    Requires:
+        root (str): directory of the archive.
+        output (str): path of the csv results table.
+        manifestPath (str, optional): path of the manifest, defaults to output + ".manifest.json".
+        sensitivity, selectedLeg, auto_detectLegs: options of the analysis (see batch.analyzeRecording).
+        processes (int, optional): size of the pool, defaults to the number of cores.
+        force (bool): analyze all the recordings, ignoring the manifest.
+    Modifies:
+        the files output and manifestPath
+    Effects:
+        Analyzes the recordings of the archive added or changed since the last run (or analyzed with another
+        configuration), writes the results table of all of them and returns the tuple (rows, number of recordings analyzed).
+    """
+    if manifestPath is None: manifestPath = output + ".manifest.json"
+    parameters = sensitivityLevel(sensitivity)
+    configuration = configurationKey(parameters, sensitivity, selectedLeg, auto_detectLegs)
+    manifest = {} if force else loadManifest(manifestPath)
+
+    rows = {}
+    entries = {}
+    tasks = []
+    for path in discoverRecordings(root):
+        relative = os.path.relpath(path, root)
+        stat = os.stat(path)
+        entry = manifest.get(relative)
+        # the content is hashed again only if size or modification time changed
+        if entry is not None and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime: digest = entry["sha256"]
+        else: digest = fileHash(path)
+        entries[relative] = {"sha256": digest, "size": stat.st_size, "mtime": stat.st_mtime, "configuration": configuration}
+        if entry is not None and entry["sha256"] == digest and entry["configuration"] == configuration and not entry["row"]["error"]:
+            rows[relative] = entry["row"]
+        else:
+            tasks.append((path, root, parameters, sensitivity, selectedLeg, auto_detectLegs))
+
+    if tasks:
+        processes = min(processes or os.cpu_count() or 1, len(tasks))
+        if processes > 1:
+            with mp.Pool(processes) as pool:
+                results = pool.imap_unordered(analyzeFile, tasks, chunksize=max(1, len(tasks) // (4 * processes)))
+                for row in results: rows[row["path"]] = row
+        else:
+            for task in tasks:
+                row = analyzeFile(task)
+                rows[row["path"]] = row
+
+    for relative, entry in entries.items(): entry["row"] = rows[relative]
+    ordered = [rows[relative] for relative in sorted(rows)]
+
+    with open(output, 'w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=COLUMNS)
+        writer.writeheader()
+        writer.writerows(ordered)
+    with open(manifestPath, 'w') as file:
+        json.dump(entries, file, indent=1, sort_keys=True)
+    return ordered, len(tasks)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-analyze the recordings of the SonicWalk archive")
+    parser.add_argument("archive", nargs="?", default=os.path.join("GUI", "data", "archive"), help="directory of the archive (default: GUI/data/archive)")
+    parser.add_argument("-o", "--output", default="reanalysis.csv", help="csv results table (default: reanalysis.csv)")
+    parser.add_argument("--manifest", default=None, help="manifest of the recordings analyzed (default: <output>.manifest.json)")
+    parser.add_argument("-s", "--sensitivity", type=int, default=3, choices=range(1, 6), help="sensitivity level (default: 3)")
+    legs = parser.add_mutually_exclusive_group()
+    legs.add_argument("--right-leg", dest="selectedLeg", action="store_const", const=True, default=None,
+                      help="the first sensor is on the step (forward) leg, no automatic leg detection")
+    legs.add_argument("--left-leg", dest="selectedLeg", action="store_const", const=False,
+                      help="the second sensor is on the step (forward) leg, no automatic leg detection")
+    parser.add_argument("-j", "--processes", type=int, default=None, help="size of the pool of processes (default: number of cores)")
+    parser.add_argument("--force", action="store_true", help="analyze all the recordings again")
+    args = parser.parse_args(argv)
+
+    start = time.time()
+    rows, analyzed = reanalyze(args.archive, args.output, args.manifest, args.sensitivity, args.selectedLeg,
+                               args.selectedLeg is None, args.processes, args.force)
+    errors = sum(1 for row in rows if row["error"])
+    print("{:d} recordings ({:d} analyzed, {:d} unchanged, {:d} errors) in {:.2f} s -> {}".format(
+        len(rows), analyzed, len(rows) - analyzed, errors, time.time() - start, args.output))
+
+if __name__ == "__main__":
+    mp.freeze_support()
+    main()
@@ -0,0 +1,115 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import tempfile
+import weakref
+import numpy as np
+
+def _removeFile(path):
+    try:
+        os.remove(path)
+    except OSError:
+        pass #still mapped (windows) or already removed
+
+class RecordStore():
+    """Growable storage for the records of one device
+
+    Records are appended into a fixed size block that is allocated on the first append.
+    When the block is full it is written to a temporary file and reused, so memory usage
+    does not depend on the length of the recording.
+    finalize() ends the recording and returns all the records as one array: a view of the
+    block if nothing was written to disk, a read only memory map of the file otherwise.
+    Records are appended by a single producer.
+    """
+    def __init__(self, dtype, blockSize:int = 3600):
+        self.__dtype = np.dtype(dtype)
+        self.__blockSize = blockSize    #3600 records are 30 seconds at 120Hz
+        self.__block = None
+        self.__count = 0                #records in the current block
+        self.__spilled = 0              #records written to disk
+        self.__file = None
+        self.__path = None
+        self.__finalizer = None
+        self.__view = None
+
+    def __len__(self):
+        return self.__spilled + self.__count
+
+    def __spill(self):
+        if self.__file is None:
+            fd, self.__path = tempfile.mkstemp(prefix="sonicwalk_", suffix=".rec")
+            self.__file = os.fdopen(fd, "wb")
+            self.__finalizer = weakref.finalize(self, _removeFile, self.__path)
+        self.__block[:self.__count].tofile(self.__file)
+        self.__spilled += self.__count
+        self.__count = 0
+
+    def append(self, records):
+        """Append a numpy.array of records"""
+        if self.__view is not None: raise RuntimeError("the store has been finalized")
+        if self.__block is None: self.__block = np.empty(self.__blockSize, dtype=self.__dtype)
+        start = 0
+        while start < records.size:
+            count = min(records.size - start, self.__blockSize - self.__count)
+            self.__block[self.__count:self.__count + count] = records[start:start + count]
+            self.__count += count
+            start += count
+            if self.__count == self.__blockSize: self.__spill()
+
+    def appendRecord(self, record):
+        """Append a single record (tuple or numpy.void), returns the stored record"""
+        if self.__view is not None: raise RuntimeError("the store has been finalized")
+        if self.__block is None: self.__block = np.empty(self.__blockSize, dtype=self.__dtype)
+        stored = self.__block[self.__count]
+        self.__block[self.__count] = record
+        self.__count += 1
+        if self.__count == self.__blockSize:
+            stored = stored.copy()
+            self.__spill()
+        return stored
+
+    def last(self):
+        """Last appended record, None if the store is empty"""
+        if self.__view is not None: return self.__view[-1] if self.__view.size > 0 else None
+        if self.__count > 0: return self.__block[self.__count - 1]
+        if self.__spilled > 0: return self.__block[self.__blockSize - 1] #the block still holds the spilled records
+        return None
+
+    def finalize(self):
+        """End the recording and return all the records as one numpy.array (no copy)"""
+        if self.__view is not None: return self.__view
+        if self.__file is None:
+            self.__view = self.__block[:self.__count] if self.__block is not None else np.zeros(0, dtype=self.__dtype)
+        else:
+            if self.__count > 0: self.__spill()
+            self.__file.close()
+            self.__block = None
+            self.__view = np.memmap(self.__path, dtype=self.__dtype, mode="r", shape=(self.__spilled,))
+        return self.__view
+
+    def close(self):
+        """Release the memory and the temporary file of the store"""
+        if self.__file is not None and not self.__file.closed: self.__file.close()
+        self.__block = None
+        self.__view = None
+        if self.__finalizer is not None: self.__finalizer()
@@ -0,0 +1,537 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import os
+import time
+import platform
+import threading
+import multiprocessing as mp
+import numpy as np
+from plotter import Plotter
+from analyzer import AnalyzerGroup
+from sharedVariables import SharedCircularIndex
+from sharedVariables import LegDetected
+from sharedVariables import ProcessWaiting
+from sharedVariables import SharedData
+from sharedVariables import ControlBlock
+from sharedVariables import SharedEventLog
+from recordStore import RecordStore
+from sensorRecords import recordDtype, fillGaps, gapStatistics, missingSamples, COUNTER_MODULO
+from batch import estimateBpm
+from sensitivity import sensitivityLevel
+
+EXECUTORS = ("auto", "process", "multiplexed", "thread")
+
+def planAnalyzers(numMtws, executor="auto", cores=None):
+    """Choose how the analyzers of numMtws sensors are run
+
+    executor is one of EXECUTORS:
+    - "process": one process for each sensor (leg)
+    - "multiplexed": a single process running the analyzers of all the sensors (see AnalyzerGroup)
+    - "thread": a thread of the recording process running the analyzers of all the sensors
+    - "auto": "process" if there is a spare core for each sensor besides the acquisition loop,
+      "multiplexed" if there are at least two cores, "thread" otherwise
+    returns a tuple (kind, groups): kind is "process" or "thread" and groups is a list
+    with the indices of the sensors analyzed by each worker
+    """
+    if executor not in EXECUTORS:
+        raise ValueError("executor must be one of {}".format(", ".join(EXECUTORS)))
+    if executor == "auto":
+        cores = mp.cpu_count() if cores is None else cores
+        if cores > numMtws: executor = "process"
+        elif cores > 1: executor = "multiplexed"
+        else: executor = "thread"
+    if executor == "process": groups = [[i] for i in range(numMtws)]
+    else: groups = [list(range(numMtws))]
+    return ("thread" if executor == "thread" else "process"), groups
+
+class DirectWriter():
+    """Event driven acquisition of one device
+
+    Called on the thread producing the samples for each new record: the record is written straight into
+    the recording buffer and its pitch into the shared ring, which wakes up the readers (once for each record).
+    Each device has its own writer, so every buffer still has a single producer.
+    Gaps of at most maxGapFill lost samples are linearly interpolated in the shared buffer,
+    so that readers see a uniform time base (the recording buffer keeps the received samples only,
+    they are interpolated in the same way when the recording is returned, see Recorder.getAnalyzedRecords).
+    """
+    def __init__(self, store, ring, maxGapFill=0):
+        self.store = store              #recording store of the device
+        self.ring = ring                #shared ring of the device (see sharedVariables.SharedRing)
+        self.maxGapFill = maxGapFill
+        self.lastCounter = None
+        self.lastPitch = None
+
+    def __call__(self, record):
+        stored = self.store.appendRecord(record)
+        counter = int(stored["sampleCounter"])
+        pitch = float(stored["pitch"])
+        missing = 0 if self.lastCounter is None else (counter - self.lastCounter) % COUNTER_MODULO - 1
+        if 0 < missing <= self.maxGapFill:
+            #the interpolated samples and the new one are written as one block
+            block = [self.lastPitch + (pitch - self.lastPitch) * k / (missing + 1) for k in range(1, missing + 1)]
+            block.append(pitch)
+            self.ring.write(block)
+        else:
+            self.ring.append(pitch)
+        self.lastCounter = counter
+        self.lastPitch = pitch
+
+class Recorder(object):
+    """Device independent part of the recordings
+
+    Handles the recording stores, the shared memory, the plotter and analyzer processes
+    and the acquisition loop of mtwRecord. A source of samples subclasses it and implements the hooks:
+    - _drain(i): numpy.array with the records of device i received since the last call
+    - _setDirectWriters(writers): hand every new record of device i to writers[i] (None restores _drain)
+    - _arm(): prepare the source for a new recording (e.g. discard the samples received since the last one)
+    - _resetOrientation(): reset the orientation of the devices before the recording starts
+    - _nowMs(): clock of the recording in milliseconds
+    - _sleep(ms): let the other processes run for ms milliseconds
+    - _clean(): release the devices after an error
+    - getOverflowCounts(): number of samples dropped by the source for each device
+    """
+    STOP_TIMEOUT = 2    #seconds given to the workers to exit when the recording is stopped
+
+    def __init__(self, updateRate:float, samplesPath:str = "", numberOfMtws:int = 2, inertial:bool = False):
+        if not isinstance(numberOfMtws, int) or numberOfMtws < 1:
+            raise ValueError("numberOfMtws must be a positive integer")
+        self.__updateRate = updateRate
+        self.__samplesPath = samplesPath
+        self.__numMtws = numberOfMtws
+        self.__recordDtype = recordDtype(inertial)
+        self.__records = [RecordStore(self.__recordDtype) for _ in range(self.__numMtws)] #one store for each Mtw device
+        self.__drainHistogram = np.zeros((self.__numMtws, 301), dtype=np.uint64) #number of iterations that drained k samples (callback buffers hold 300 samples)
+        self.__lastRecords = [None] * self.__numMtws #last record delivered to the readers, for each device
+        self.__maxGapFill = 0
+        self.__recordingStopped = False
+        self.__armLatency = None
+
+    def __enter__(self):
+        return self
+
+    def _drain(self, i):
+        raise NotImplementedError
+
+    def _setDirectWriters(self, writers):
+        if writers is not None: raise NotImplementedError("event driven acquisition is not supported by this source")
+
+    def _arm(self):
+        pass
+
+    def _resetOrientation(self):
+        pass
+
+    def _nowMs(self):
+        return time.time() * 1000
+
+    def _sleep(self, ms):
+        time.sleep(ms / 1000)
+
+    def _clean(self):
+        pass
+
+    def __getEuler(self):
+        """Drain data from the source,
+
+        every pending record of each device is pulled in one call and written
+        as a contiguous block into the class buffer
+        returns a list of numpy.array blocks of records one for each buffer
+        the corresponding block is empty if no data was available
+        gaps of at most maxGapFill lost samples are interpolated in the returned blocks
+        (the class buffer keeps the received records only, see getAnalyzedRecords)
+
+        Has to consume data faster than it is produced otherwise data is lost
+        (buffersize is 300 packets for each device)
+        """
+
+        blocks = [None] * self.__numMtws
+        try:
+
+            for i in range(self.__numMtws):
+                block = self._drain(i)
+                count = block.size
+                if count > 0:
+                    #whole records are copied in bulk into the recording store
+                    self.__records[i].append(block)
+                self.__drainHistogram[i][min(count, self.__drainHistogram.shape[1] - 1)] += 1
+                blocks[i] = self.__uniformBlock(i, block)
+
+            return blocks
+
+        except (Exception) as error:
+            print(error)
+            self._clean()
+            raise error
+            # sys.exit(1)
+
+    @staticmethod
+    def __lastPitch(store):
+        last = store.last()
+        return None if last is None else float(last["pitch"])
+
+    def __uniformBlock(self, i, block):
+        """Interpolate the samples lost before and inside block (gaps of at most maxGapFill samples)"""
+        if block.size == 0: return block
+        last = self.__lastRecords[i]
+        self.__lastRecords[i] = block[-1].copy()
+        if self.__maxGapFill <= 0: return block
+        if last is None:
+            return fillGaps(block, self.__maxGapFill)
+        return fillGaps(np.concatenate((last.reshape(1), block)), self.__maxGapFill)[1:]
+
+    def __cleanBuffer(self):
+        for store in self.__records: store.close()
+        self.__records = [RecordStore(self.__recordDtype) for _ in range(self.__numMtws)]
+        self.__drainHistogram = np.zeros((self.__numMtws, 301), dtype=np.uint64)
+        self.__lastRecords = [None] * self.__numMtws
+
+    def __loadSamples(self, loadSamples=True):
+        if not loadSamples: return None
+        #check if sample list is empty before returning
+        try:
+            files = [os.path.join(self.__samplesPath, f) for f in os.listdir(self.__samplesPath)
+                    if os.path.isfile(os.path.join(self.__samplesPath, f))]
+            files.sort() #sort filenames in order
+            samples = []
+            print("loading wave samples...")
+            for f in files:
+                if f.lower().endswith((".wav", ".mp3")):
+                # if f.lower().endswith(".wav"):
+                    # samples.append(sa.WaveObject.from_wave_file(f))
+                    samples.append(f)
+            if len(samples) == 0:
+                print("No wav or mp3 file was found at given pathname...Aborting. Check file extensions")
+                raise Exception("No wav or mp3 file was found at given pathname.")
+        except:
+            print("samples could not be loaded...Aborting. Check pathname syntax")
+            self._clean()
+            raise Exception("samples could not be loaded.")
+            # sys.exit(1)
+        else:
+            print("...samples loaded successfully")
+
+        return samples
+
+    def __arm(self):
+        """Arm the source for the recording, the time it takes is kept as start-of-trial latency"""
+        armStart = time.perf_counter()
+        self._arm()
+        self.__armLatency = (time.perf_counter() - armStart) * 1000
+        print("Recording armed in {:.1f} ms".format(self.__armLatency))
+
+    def __startDirectWriting(self, rings):
+        """Switch every device to event driven acquisition"""
+        self._setDirectWriters([DirectWriter(self.__records[i], rings[i], self.__maxGapFill) for i in range(self.__numMtws)])
+
+    def __stopDirectWriting(self):
+        """Restore buffered acquisition, no sample is written by the source after this call"""
+        self._setDirectWriters(None)
+
+    def mtwRecord(self, duration:float, plot:bool=False, analyze:bool=True, exType:int=0, sensitivityLev:int=3, auto_detectLegs:bool=True, selectedLeg:bool=None, calculateBpm:bool=False, shared_data:object=None, setStart:callable=None, sound:bool=True, eventDriven:bool=False, maxGapFill:int=12, executor:str="auto", startTimeout:float=30):
+        """Record pitch data for duration seconds
+
+        Returns a numpy.array object containing the data for each device and the relative index, and interesting points bidimensional array of indexes
+        The fifth element of the returned tuple contains the full sensor records of each device
+        pitch, records and interesting points share the indices of the samples given to the analyzers:
+        the samples lost in gaps of at most maxGapFill samples are interpolated (see getAnalyzedRecords)
+        (sample counter, timestamp, roll/pitch/yaw and, if enabled, gyroscope and acceleration)
+        the length of the recording is not limited: completed blocks of records are moved to a temporary file
+        Additional flags can be supplied:
+
+        if plot=True it spawns a daemon that handles plotting
+        if analyze=True (default) it spawns a daemon that performs step counting
+        exType defines the type of analysis to be performed
+        if auto_detectLegs = True it automatically detect backward and forward legs
+        sensitivityLev is a level of sensitivity in range 1 to 5
+        if eventDriven=True samples are written into the recording and shared buffers directly
+        by the source (no polling loop) and the analyzers are woken up as soon as a sample lands
+        packet loss is detected with the sample counter of the devices: gaps of at most maxGapFill samples
+        (default 12, 100ms at 120Hz, 0 disables) are interpolated in the data given to analyzers and plotter,
+        the gap statistics of each device are returned in the last element of the result
+        executor selects how the analyzers are run (see planAnalyzers), the recording starts as soon as
+        the plotter and the analyzers signal they are ready (at most startTimeout seconds)
+        """
+        control = None
+        try:
+            if not isinstance(duration, int) or duration <= 10:
+                raise ValueError("duration must be a positive integer (> 10) indicating the number of seconds")
+
+            self.__cleanBuffer()
+            self.__maxGapFill = maxGapFill
+            self.__recordingStopped = False
+
+            if shared_data is None:
+                # print("in mtw shared data is none")
+                #Declare and initialize the shared rings (single producer, not lock protected)
+                shared_data = SharedData(self.__numMtws)
+            elif shared_data.nSensors < self.__numMtws:
+                raise ValueError("shared_data must hold a buffer for each one of the {:d} sensors".format(self.__numMtws))
+
+            rings = shared_data.rings[:self.__numMtws]
+            #readers are woken up by the notifier of the rings, each worker subscribes a slot
+            notifier = shared_data.notifier
+            notifier.reset()
+            #the state of the recording and the results lengths are kept out of band in the control block
+            control = shared_data.control
+            control.reset()
+            for ring in rings: ring.reset()
+            control.setState(ControlBlock.RUNNING)
+
+            #events are published live by the analyzers in append only logs
+            events = shared_data.events[:self.__numMtws]
+            for log in events:
+                log.reset()
+                log.reserve()
+
+            analyzer_processes = []
+
+            if any((plot, analyze)):
+
+                if analyze: workerKind, groups = planAnalyzers(self.__numMtws, executor)
+                else: groups = []
+                #every worker and the plotter signal when they are ready, the recording starts once all of them are
+                ready = ProcessWaiting(len(groups) + (1 if plot else 0) + 1)
+
+                if plot:
+                    plotter = Plotter()
+                    plotter_process = mp.Process(target=plotter, args=(rings, control, ready.start), daemon=True)
+                    plotter_process.start()
+
+                if analyze:
+                    #samples are loaded only if analyzer is has to spawn
+                    samples = self.__loadSamples(sound)
+                    if samples is not None: sharedIndex = SharedCircularIndex(len(samples))
+                    else: sharedIndex = None
+                    sharedLegBool = LegDetected()
+                    #the parameter file is validated and compiled once, the workers receive the parameters of the level
+                    parameters = sensitivityLevel(sensitivityLev)
+                    # each worker (process or thread) runs the analyzers of its group multiplexed (see AnalyzerGroup)
+                    Worker = threading.Thread if workerKind == "thread" else mp.Process
+                    for w, group in enumerate(groups):
+                        workerArgs = []
+                        for i in group:
+                            # First id device assumed as right leg, second id device assumed as left leg:
+                            # the selected (forward) leg is the right one if selectedLeg is True, the left one otherwise
+                            leg = selectedLeg if i % 2 == 0 else not selectedLeg
+                            workerArgs.append((rings[i], control, i, sharedIndex, samples, exType, parameters, auto_detectLegs, leg, sharedLegBool, events[i], sound, self.__updateRate))
+                        analyzer_processes.append(Worker(target=AnalyzerGroup(), name="analyzer{:d}".format(w), args=(workerArgs, ready.start, notifier.subscribe()), daemon=True))
+                    for process in analyzer_processes:
+                        process.start()
+                    #delete local version of samples
+                    # del samples
+                    # gc.collect()
+
+                #wait for the plotter and the analyzers to be ready before starting orientation reset
+                if not ready.start(startTimeout):
+                    raise RuntimeError("The analysis processes did not start within {} seconds".format(startTimeout))
+                self._resetOrientation()
+
+                try:
+                    if setStart is not None: setStart()
+                except:
+                    raise RuntimeError("Impossible to call setStart function")
+
+                print("Recording started..." + str(time.time()))
+                os = platform.system()
+
+                self.__arm()
+                if eventDriven: self.__startDirectWriting(rings)
+
+                startTime = self._nowMs()
+                prev_data_time = time.time()
+                prev_data = None
+                while self._nowMs() - startTime <= 1000*duration:
+                    if self.__recordingStopped:
+                        # self.__recordingStopped = False
+                        if eventDriven: self.__stopDirectWriting()
+                        control.setState(ControlBlock.STOPPED)
+                        notifier.notify() #analyzers exit on their own
+                        #the workers are given the time to exit, only those still running are terminated
+                        for process in analyzer_processes:
+                            process.join(self.STOP_TIMEOUT)
+                            if process.is_alive() and hasattr(process, "terminate"): process.terminate()
+                        if plot:
+                            plotter_process.join(self.STOP_TIMEOUT)
+                            if plotter_process.is_alive(): plotter_process.terminate()
+                        notifier.reset()
+                        # self.__clean()
+                        # break
+                        return None
+                    if not eventDriven: blocks = self.__getEuler()
+
+                    # if there are the same data related of a sensor for 6 seconds, the sensor is unavailable, raise exception
+                    if time.time()-prev_data_time >= 6:
+                        prev_data_time = time.time()
+                        coords = [self.__lastPitch(store) for store in self.__records]
+                        if prev_data is not None:
+                            if any(prev == coord for prev, coord in zip(prev_data, coords)):
+                                raise Exception("Error: Unable to record all sensors data, one of the sensors failed. Please retry and if necessary reboot the sensors.")
+                        prev_data = coords
+
+                    #the segments of the event logs are allocated here, ahead of the analyzers (see SharedEventLog.reserve)
+                    for log in events: log.reserve()
+
+                    if eventDriven:
+                        #data is written by the source, only check for the end of the recording
+                        self._sleep(20)
+                        continue
+
+                    written = False
+                    for i in range(self.__numMtws):
+                        if blocks[i].size > 0: #send only new data
+                            rings[i].write(blocks[i]["pitch"], notify=False)
+                            written = True
+                    if written: notifier.notify() #wakes up the readers once for all the rings
+                    #allow other processes to run
+                    #sleep 3ms (a new packet is received roughly every 8.33ms)
+
+                    self._sleep(0) if os =="Windows" else self._sleep(3)
+
+                if eventDriven: self.__stopDirectWriting()
+                control.setState(ControlBlock.STOPPING) #analyzers publish their results and exit
+                notifier.notify()
+                print("Samples dropped by the source: {}".format(self.getOverflowCounts()))
+                print("Maximum number of samples drained per iteration: {}".format(self.getMaxDrainedPerIteration()))
+                print("Packet loss: {}".format(self.getGapStatistics()))
+
+                # if not self.__recordingStopped:
+                if plot:
+                    plotter_process.join()
+                if analyze:
+                    for process in analyzer_processes:
+                        process.join()
+                    notifier.reset()
+                    #result of step counting is written into the control block
+                    print("Total number of steps: {:d}".format(sum(control.movements(i) for i in range(self.__numMtws))))
+
+            else:
+                #record the data and return it without analisys
+                self.__arm()
+                if eventDriven: self.__startDirectWriting(rings)
+                startTime = self._nowMs()
+                while self._nowMs() - startTime <= 1000*duration:
+                    if eventDriven: self._sleep(20)
+                    else: _ = self.__getEuler() #fills object buffer with data from Mtw devices
+                if eventDriven: self.__stopDirectWriting()
+            control.setState(ControlBlock.STOPPED)
+
+            if analyze:
+                # create bidimentional array of interesting points
+                movements = [log.events(SharedEventLog.MOVEMENT) for log in events]
+                interestingPoints = [m["sampleIndex"] for m in movements]
+
+                if calculateBpm:
+                    # convert the sample times of the interesting points to bpm value
+                    bpmTimeValue = estimateBpm(np.concatenate([m["sampleTime"] for m in movements]))
+                else: bpmTimeValue = False
+
+                #the interesting points index the samples seen by the analyzers (short gaps interpolated)
+                records = self.getAnalyzedRecords()
+                return ([r["pitch"] for r in records], np.array([r.size for r in records], dtype=np.int64), interestingPoints, bpmTimeValue, records, self.getGapStatistics())
+            records = self.getAnalyzedRecords()
+            return ([r["pitch"] for r in records], np.array([r.size for r in records], dtype=np.int64), [[] for _ in range(self.__numMtws)], False, records, self.getGapStatistics())
+
+        except (Exception) as error:
+            print(error)
+            if control is not None: control.setState(ControlBlock.STOPPED)
+            self.__stopDirectWriting()
+            self._clean()
+            raise error
+            # sys.exit(1)
+
+    def getDrainHistogram(self):
+        """Histogram of the samples drained per acquisition loop iteration
+
+        element [i][k] is the number of iterations that drained k samples from device i
+        (the last bin also counts larger drains)
+        """
+        return self.__drainHistogram.copy()
+
+    def getMaxDrainedPerIteration(self):
+        """Largest number of samples drained in a single iteration for each device"""
+        return [int(np.flatnonzero(h)[-1]) if h.any() else 0 for h in self.__drainHistogram]
+
+    def getGapStatistics(self):
+        """Packet loss statistics of the last recording for each device (see sensorRecords.gapStatistics)"""
+        return [gapStatistics(records) for records in self.getRecords()]
+
+    def getRecords(self):
+        """Records of the last recording for each device
+
+        ends the recording: the stores are finalized and a view of all their records is returned
+        (a memory map of a temporary file for long recordings)
+        """
+        return [store.finalize() for store in self.__records]
+
+    def getAnalyzedRecords(self):
+        """Records of the last recording for each device as delivered to the shared rings
+
+        the samples lost in gaps of at most maxGapFill samples are linearly interpolated (see sensorRecords.fillGaps),
+        so the global indices of the rings (e.g. the interesting points) index these records;
+        the records are the received ones (getRecords) if no gap was filled
+        ends the recording like getRecords
+        """
+        analyzed = []
+        for records in self.getRecords():
+            missing = missingSamples(records["sampleCounter"]) if records.size > 1 else np.zeros(0, dtype=np.int64)
+            if self.__maxGapFill > 0 and np.any((missing > 0) & (missing <= self.__maxGapFill)):
+                records = fillGaps(records, self.__maxGapFill)
+            analyzed.append(records)
+        return analyzed
+
+    def getIndices(self):
+        """Number of records of the last recording for each device"""
+        return np.array([len(store) for store in self.__records], dtype=np.int64)
+
+    def getUpdateRate(self):
+        """Sampling frequency (Hz) of the devices"""
+        return self.__updateRate
+
+    def getNumberOfMtws(self):
+        """Number of recorded devices"""
+        return self.__numMtws
+
+    def getRecordDtype(self):
+        """Structured dtype of the records (see sensorRecords)"""
+        return self.__recordDtype
+
+    def getArmLatency(self):
+        """Time (ms) spent arming the source at the start of the last recording, None before the first one"""
+        return self.__armLatency
+
+    def setSamplesPath(self, samplesPath:str):
+        """Library of samples played by the analyzers of the next recordings"""
+        self.__samplesPath = samplesPath
+
+    def getOverflowCounts(self):
+        """Number of samples dropped by the source for each device"""
+        return [0] * self.__numMtws
+
+    def stopRecording(self):
+        self.__recordingStopped = True
+
+    def clean(self):
+        self._clean()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._clean()
@@ -0,0 +1,107 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import time
+import threading
+import numpy as np
+from recorder import Recorder
+from sensorRecords import recordDtype, readRecording, COUNTER_MODULO
+
+class MtwReplay(Recorder):
+    """Hardware-free source of samples replaying a recording saved by the GUI
+
+    Same recording interface as MtwAwinda (mtwRecord, stopRecording, clean, with block):
+    the pitch of each sensor of the csv file at path is streamed through the whole pipeline
+    (shared memory, plotter, analyzers) as if it came from the devices.
+    speed is the replay speed: 1 real time (default), N N times faster, 0 as fast as possible
+    (at most maxBlock samples of each sensor are delivered per acquisition loop iteration).
+    The recording ends with the file (or after the duration passed to mtwRecord, in recording time);
+    call rewind() before recording it again.
+    """
+    def __init__(self, path:str, speed:float = 1.0, samplesPath:str = "", maxBlock:int = 300):
+        if speed < 0: raise ValueError("speed must be a positive number (0 for as fast as possible)")
+        signals, Fs = readRecording(path)
+        super().__init__(Fs, samplesPath, signals.shape[0], False)
+        self.__speed = speed
+        self.__maxBlock = maxBlock
+        self.__records = []
+        for signal in signals:
+            records = np.zeros(signal.size, dtype=recordDtype())
+            records["sampleCounter"] = np.arange(signal.size) % COUNTER_MODULO
+            records["timestamp"] = np.arange(signal.size) / Fs
+            records["pitch"] = signal
+            self.__records.append(records)
+        self.__feeder = None
+        self.__stopFeeder = threading.Event()
+        self.rewind()
+
+    def rewind(self):
+        """Restart the replay from the beginning of the recording"""
+        self.__position = [0] * len(self.__records)   #samples delivered for each sensor
+        self.__startTime = None                         #wall clock time of the start of the replay
+
+    def __finished(self):
+        return all(position >= records.size for position, records in zip(self.__position, self.__records))
+
+    def __due(self, i):
+        """Samples of sensor i that have to be delivered now"""
+        if self.__startTime is None: self.__startTime = time.perf_counter()
+        records = self.__records[i]
+        if self.__speed == 0:
+            end = self.__position[i] + self.__maxBlock
+        else:
+            end = int((time.perf_counter() - self.__startTime) * self.__speed * self.getUpdateRate()) + 1
+        end = min(end, records.size)
+        block = records[self.__position[i]:end].copy()
+        self.__position[i] = max(end, self.__position[i])
+        return block
+
+    def _drain(self, i):
+        return self.__due(i)
+
+    def __feed(self, writers):
+        while not self.__stopFeeder.is_set() and not self.__finished():
+            for i, writer in enumerate(writers):
+                for record in self.__due(i):
+                    writer(record)
+            if self.__speed != 0: time.sleep(0.001)
+
+    def _setDirectWriters(self, writers):
+        if self.__feeder is not None:
+            self.__stopFeeder.set()
+            self.__feeder.join()
+            self.__feeder = None
+        if writers is not None:
+            self.__stopFeeder.clear()
+            self.__feeder = threading.Thread(target=self.__feed, args=(writers,), daemon=True)
+            self.__feeder.start()
+
+    def _nowMs(self):
+        """Recording time of the replay in milliseconds (infinite once the whole file has been delivered)"""
+        if self.__finished(): return float("inf")
+        if self.__startTime is None: self.__startTime = time.perf_counter()
+        if self.__speed == 0:
+            return min(self.__position) / self.getUpdateRate() * 1000
+        return (time.perf_counter() - self.__startTime) * self.__speed * 1000
+
+    def _sleep(self, ms):
+        time.sleep(ms / 1000)
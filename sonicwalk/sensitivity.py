@@ -0,0 +1,167 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+# Sensitivity parameters of the exercises.
+# sensitivity_levels.json (next to this module, comments allowed) is validated and compiled once into
+# immutable tuples with the parameters of each exercise for each level, so that the detectors read plain
+# attributes instead of walking nested dictionaries. The compiled table is cached until the file changes.
+
+import os
+import re
+import json
+import math
+from typing import NamedTuple
+
+PARAMETERS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "sensitivity_levels.json")
+LEVELS = (1, 2, 3, 4, 5)
+
+class WalkParameters(NamedTuple):
+    displacement: float     #shift of the signal (degrees), anticipates the zero crossings
+    validRange: float       #peaks lower than the adaptive threshold by at most validRange are valid
+    min_threshold: float    #minimum of the adaptive threshold of the peaks
+    time_threshold: float   #minimum time between steps (seconds)
+
+class MarchParameters(NamedTuple):
+    threshold: float        #shift of the signal (degrees), it is also the threshold of the peaks
+
+class LegDetectionParameters(NamedTuple):
+    displacement: float     #shift of the signal in the automatic leg detection (degrees)
+
+class StepLegParameters(NamedTuple):
+    min_peak_threshold: float
+    validRange: float
+    time_threshold: float
+
+class OtherLegParameters(NamedTuple):
+    displacement: float
+    valid_gradient_range: float
+    min_gradient_threshold: float
+    time_threshold: float
+    alpha: float            #weight of the new gradient in the adaptive gradient threshold
+
+class SwingParameters(NamedTuple):
+    step_leg: StepLegParameters
+    other_leg: OtherLegParameters
+    leg_detection: LegDetectionParameters
+
+class TandemParameters(NamedTuple):
+    displacement0: float    #shift of the signal of the forward leg
+    displacement1: float    #shift of the signal of the backward leg
+    valid_gradient_range: float
+    min_gradient_threshold: float
+    time_threshold: float
+    alpha: float
+    leg_detection: LegDetectionParameters
+
+class SensitivityLevel(NamedTuple):
+    """Parameters of all the exercises for one sensitivity level"""
+    level: int
+    walk: WalkParameters
+    march: MarchParameters
+    swing: SwingParameters
+    tandem: TandemParameters
+
+def readParameterFile(path=PARAMETERS_PATH):
+    """
+    Effects:
+        Returns: the dictionary of the JSON file at path (// and /* */ comments are removed).
+    """
+    def remove_comments(json_string):
+        # Remove // comments
+        json_string = re.sub(r'\/\/.*', '', json_string)
+        # Remove /* ... */ comments
+        json_string = re.sub(r'\/\*.*?\*\/', '', json_string, flags=re.DOTALL)
+        return json_string
+    with open(path, 'r') as file:
+        json_string = file.read()
+    return json.loads(remove_comments(json_string))
+
+def _compile(kind, data, *keys, **nested):
+    """Instance of the NamedTuple kind with the numeric fields read from data[keys...] (nested fields are given)"""
+    name = "/".join(keys)
+    for key in keys:
+        if not isinstance(data, dict) or key not in data:
+            raise ValueError("Invalid sensitivity parameters: missing '{}'".format(name))
+        data = data[key]
+    values = {}
+    for field in kind._fields:
+        if field in nested:
+            values[field] = nested[field]
+            continue
+        value = data.get(field) if isinstance(data, dict) else None
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+            raise ValueError("Invalid sensitivity parameters: '{}/{}' must be a number (found {!r})".format(name, field, value))
+        values[field] = float(value)
+    if values.get("time_threshold", 0.0) < 0:
+        raise ValueError("Invalid sensitivity parameters: '{}/time_threshold' must not be negative".format(name))
+    if not 0.0 <= values.get("alpha", 0.0) <= 1.0:
+        raise ValueError("Invalid sensitivity parameters: '{}/alpha' must be in [0, 1]".format(name))
+    return kind(**values)
+
+def compileParameters(data):
+    """
+    Requires:
+        data (dict): sensitivity parameters as in sensitivity_levels.json.
+    Effects:
+        Returns: dict with the SensitivityLevel of each level in LEVELS.
+        Raises ValueError if a parameter is missing or not valid.
+    """
+    table = {}
+    for level in LEVELS:
+        key = "sensitivity_{:d}".format(level)
+        table[level] = SensitivityLevel(
+            level=level,
+            walk=_compile(WalkParameters, data, "walk", key),
+            march=_compile(MarchParameters, data, "march", key),
+            swing=SwingParameters(
+                step_leg=_compile(StepLegParameters, data, "swing", "step_leg", key),
+                other_leg=_compile(OtherLegParameters, data, "swing", "other_leg", key),
+                leg_detection=_compile(LegDetectionParameters, data, "swing", "leg_detection", key)),
+            tandem=_compile(TandemParameters, data, "tandem", key,
+                            leg_detection=_compile(LegDetectionParameters, data, "tandem", "leg_detection", key)),
+        )
+    return table
+
+_cache = {}    #path -> (modification time, size, compiled table)
+
+def loadSensitivity(path=PARAMETERS_PATH):
+    """
+    Effects:
+        Returns: the compiled table of the parameter file at path (see compileParameters).
+        The file is read and validated again only if its modification time or size changed since the last call.
+    """
+    stat = os.stat(path)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == stat.st_mtime_ns and cached[1] == stat.st_size: return cached[2]
+    table = compileParameters(readParameterFile(path))
+    _cache[path] = (stat.st_mtime_ns, stat.st_size, table)
+    return table
+
+def sensitivityLevel(level=3, path=PARAMETERS_PATH):
+    """
+    Effects:
+        Returns: the SensitivityLevel with the parameters of all the exercises for level (1 to 5).
+    """
+    table = loadSensitivity(path)
+    if level not in table:
+        raise ValueError("sensitivity level must be an integer in range 1 to 5 (found {!r})".format(level))
+    return table[level]
@@ -0,0 +1,190 @@
+# MIT License
+
+# Copyright (c) 2024 Gabriele Esposito & Roberto Tallarini
+
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+
+# The above copyright notice and this permission notice shall be included in all
+# copies or substantial portions of the Software.
+
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
+# SOFTWARE.
+
+import csv
+import numpy as np
+
+# Layout of a single sensor sample.
+# - sampleCounter: packet counter assigned by the MTw (16 bit, wraps around)
+# - timestamp: hardware sample time in seconds (falls back to the time of arrival)
+# - roll, pitch, yaw: Euler angles in degrees
+# - gyr, acc: calibrated angular velocity (rad/s) and acceleration (m/s^2), only if requested
+
+BASE_FIELDS = [
+    ("sampleCounter", np.uint32),
+    ("timestamp", np.float64),
+    ("roll", np.float64),
+    ("pitch", np.float64),
+    ("yaw", np.float64),
+]
+
+INERTIAL_FIELDS = [
+    ("gyr", np.float64, (3,)),
+    ("acc", np.float64, (3,)),
+]
+
+def recordDtype(inertial:bool=False):
+    """Structured dtype of a sensor record
+
+    if inertial=True calibrated gyroscope and acceleration fields are included
+    """
+    return np.dtype(BASE_FIELDS + INERTIAL_FIELDS if inertial else BASE_FIELDS)
+
+def hasInertial(dtype):
+    """True if records of the given dtype carry gyroscope and acceleration data"""
+    return "gyr" in dtype.names
+
+# The MTw packet counter is 16 bit wide
+COUNTER_MODULO = 65536
+
+def unwrapCounter(counters):
+    """Monotonic (unwrapped) version of the 16 bit packet counters of consecutive records"""
+    counters = np.asarray(counters, dtype=np.int64)
+    if counters.size == 0: return counters
+    steps = np.diff(counters) % COUNTER_MODULO
+    return np.concatenate(([counters[0]], counters[0] + np.cumsum(steps)))
+
+def missingSamples(counters):
+    """Number of samples lost between each pair of consecutive records (0 if none, duplicates count as 0)"""
+    steps = np.diff(unwrapCounter(counters))
+    return np.maximum(steps - 1, 0)
+
+def gapStatistics(records):
+    """Packet loss statistics of the records of one device
+
+    returns a dict with the number of received and lost samples, the number of gaps,
+    the longest gap (in samples) and the fraction of lost samples
+    """
+    missing = missingSamples(records["sampleCounter"]) if records.size > 1 else np.zeros(0, dtype=np.int64)
+    lost = int(missing.sum())
+    return {
+        "received": int(records.size),
+        "lost": lost,
+        "gaps": int(np.count_nonzero(missing)),
+        "maxGap": int(missing.max()) if missing.size > 0 else 0,
+        "lossRatio": lost / (records.size + lost) if records.size + lost > 0 else 0.0,
+    }
+
+def fillGaps(records, maxGap=None):
+    """Insert the samples lost between consecutive records
+
+    The values of the inserted samples are linearly interpolated (sample counter excluded, which is
+    made consecutive) so that the result has a uniform time base.
+    Only gaps of at most maxGap samples are filled (all of them if maxGap is None),
+    longer gaps are left as they are.
+    """
+    if records.size < 2: return records.copy()
+    counter = unwrapCounter(records["sampleCounter"])
+    missing = np.maximum(np.diff(counter) - 1, 0)
+    if maxGap is not None: missing[missing > maxGap] = 0
+    if not missing.any(): return records.copy()
+
+    # position of the original records in the output
+    positions = np.arange(records.size) + np.concatenate(([0], np.cumsum(missing)))
+    total = positions[-1] + 1
+    original = np.zeros(total, dtype=bool)
+    original[positions] = True
+
+    out = np.zeros(total, dtype=records.dtype)
+    out[positions] = records
+
+    # inserted samples continue the counter of the last original record before them
+    rows = np.arange(total)
+    lastOriginal = np.maximum.accumulate(np.where(original, rows, 0))
+    outCounter = np.zeros(total, dtype=np.int64)
+    outCounter[positions] = counter
+    outCounter = outCounter[lastOriginal] + (rows - lastOriginal)
+    out["sampleCounter"] = outCounter % COUNTER_MODULO
+
+    inserted = ~original
+    for name in records.dtype.names:
+        if name == "sampleCounter": continue
+        values = records[name]
+        if values.ndim == 1:
+            out[name][inserted] = np.interp(outCounter[inserted], counter, values)
+        else:
+            for column in range(values.shape[1]):
+                out[name][inserted, column] = np.interp(outCounter[inserted], counter, values[:, column])
+    return out
+
+# sampleTimeFine is a 32 bit counter of 100 us units
+TIMESTAMP_MODULO = 2**32 * 1e-4
+
+def unwrapTimestamps(timestamps):
+    """Monotonic (unwrapped) version of the hardware timestamps (in seconds) of consecutive records"""
+    timestamps = np.asarray(timestamps, dtype=np.float64)
+    if timestamps.size == 0: return timestamps
+    steps = np.diff(timestamps)
+    steps[steps < -TIMESTAMP_MODULO / 2] += TIMESTAMP_MODULO
+    return np.concatenate(([timestamps[0]], timestamps[0] + np.cumsum(steps)))
+
+def alignRecords(records, Fs, field="pitch"):
+    """Resample a field of the records of several devices onto one shared uniform time grid
+
+    records is a list with the records of each device, the hardware timestamps of the devices
+    (synchronized by the Awinda master) are used to linearly interpolate the field at the
+    sampling frequency Fs over the time span covered by all of the devices
+    returns a tuple (time, values): time in seconds from the start of the grid and
+    a numpy.array with a row for each device (empty if the devices do not overlap)
+    """
+    times = []
+    values = []
+    for device in records:
+        t = unwrapTimestamps(device["timestamp"])
+        keep = np.concatenate(([True], np.diff(t) > 0)) #drop duplicated samples (np.interp needs increasing times)
+        times.append(t[keep])
+        values.append(np.asarray(device[field], dtype=np.float64)[keep])
+
+    if len(times) == 0 or any(t.size < 2 for t in times):
+        return np.zeros(0), np.zeros((len(records), 0))
+    start = max(t[0] for t in times)
+    end = min(t[-1] for t in times)
+    if end <= start:
+        return np.zeros(0), np.zeros((len(records), 0))
+
+    grid = start + np.arange(int(np.floor((end - start) * Fs + 1e-9)) + 1) / Fs
+    aligned = np.vstack([np.interp(grid, t, v) for t, v in zip(times, values)])
+    return grid - start, aligned
+
+def readRecording(path:str):
+    """Read a recording saved by the GUI (csv file)
+
+    the file starts with the rows "Fs,<sampling frequency>" and "Comment,<comment>",
+    then each row holds one sample of every sensor (empty cells are ignored)
+    returns a tuple (signals, Fs): numpy.array with a row for each sensor and the sampling frequency
+    """
+    Fs = None
+    rows = []
+    with open(path, 'r', newline='') as file:
+        for row in csv.reader(file):
+            if len(row) == 0: continue
+            if row[0] == "Fs":
+                Fs = float(row[1])
+                continue
+            if row[0] == "Comment": continue
+            values = [float(item) for item in row if item.strip() != ""]
+            if len(values) > 0: rows.append(values)
+    if Fs is None or len(rows) == 0:
+        raise ValueError("{} is not a valid recording".format(path))
+    nSensors = len(rows[0])
+    signals = np.array([values for values in rows if len(values) == nSensors]).T
+    return signals, Fs
@@ -20,7 +20,13 @@
 # OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE
 # SOFTWARE.
 
-from multiprocessing import Value, Event, Lock, RawArray, RawValue
+from multiprocessing import Value, Barrier, BoundedSemaphore
+from multiprocessing.sharedctypes import RawArray
+from threading import BrokenBarrierError, Lock
+from multiprocessing import shared_memory
+import weakref
+import os
+import numpy as np
 import time
 
 
@@ -57,47 +63,429 @@ class LegDetected():
         
 class ProcessWaiting():
     """
-        inter process comunication to understand when both are running
-        Synchronize the processes with a delay < 0.0001 seconds.
+        inter process comunication to understand when all the analyzer processes are running
+        Synchronize the processes with a barrier released once every party has called start.
+        Used as readiness signal: workers call start once initialized, the recorder waits for all of them.
     """
-    def __init__(self):
-        self.secondProcessStart = Event()
-        self.firstProcessStart = Event()
+    def __init__(self, parties=2):
+        self.barrier = Barrier(parties)
 
-        self.firstLock = Lock()
-        self.secondLock = Lock()
+    def start(self, timeout=None):    # Triggered by each of the processes, returns when all of them are running
+        """returns False if the timeout (seconds) expired or another party gave up waiting"""
+        try:
+            self.barrier.wait(timeout)
+            return True
+        except BrokenBarrierError:
+            return False
 
-    def _second(self):
-        self.secondProcessStart.set()
+def _releaseSharedMemory(shm, unlink):
+    try:
+        shm.close()
+    except BufferError:
+        pass #numpy views are still alive, the mapping is released with them
+    if unlink:
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
 
-    def _first(self):
-        self.firstProcessStart.set()
-        # Once the first signal is emitted, I set the waiting period for the second one
-        self.secondProcessStart.wait()
-        # Once the second signal is emitted, I clean up both signals
-        self.secondProcessStart.clear()
-        self.firstProcessStart.clear()
+class RingNotifier:
+    """
+        Wakes up the readers of one or more rings without ever blocking the producer
 
-    def start(self):    # Triggered by one of the 2 processes
-        
-        # If the second process calls start, the first signal has already been emitted, so I emit the second signal and terminate
-        if self.firstProcessStart.is_set():
-            with self.secondLock:
-                self._second()
+        Every reader (worker) waits on its own slot: a semaphore subscribed by the process starting the readers.
+        notify() only releases the semaphore of each subscribed slot, it never waits for the readers
+        (as the notification of a multiprocessing.Condition does) and takes no lock, so a reader terminated
+        while waiting cannot block the next recordings. The semaphores are bounded to 1: the notifications
+        received while a reader is busy are coalesced into one.
+    """
+    def __init__(self, slots=2):
+        self.slots = slots
+        self.__semaphores = []
+        for _ in range(slots):
+            semaphore = BoundedSemaphore(1)
+            semaphore.acquire()     #no pending notification
+            self.__semaphores.append(semaphore)
+        self.__subscribed = RawArray('b', slots)    #1 for the slots in use (written by the subscribing process only)
 
-        # If the first process calls start, the first signal has not been emitted yet, so I emit it
-        else:
-            with self.firstLock:
-                self._first()
+    def subscribe(self):
+        """Reserve a slot for a new reader (to be called before starting the reader), returns the slot"""
+        for slot in range(self.slots):
+            if not self.__subscribed[slot]:
+                self.__semaphores[slot].acquire(False)  #discard an old notification
+                self.__subscribed[slot] = 1
+                return slot
+        raise RuntimeError("no free notification slot ({:d} readers already subscribed)".format(self.slots))
 
-class SharedData:
-    def __init__(self):
-        self.index0 = RawValue('i', 0)
-        self.index1 = RawValue('i', 0)
-        self.data0 = RawArray('d', 1000)
-        self.data1 = RawArray('d', 1000)
-    
+    def unsubscribe(self, slot):
+        self.__subscribed[slot] = 0
 
-        
+    def reset(self):
+        """Release all the slots (to be called when no reader is waiting)"""
+        for slot in range(self.slots): self.unsubscribe(slot)
 
-        
+    def notify(self):
+        """Wake up the subscribed readers (never blocks)"""
+        subscribed = self.__subscribed
+        for slot in range(self.slots):
+            if subscribed[slot]:
+                try:
+                    self.__semaphores[slot].release()
+                except ValueError:
+                    pass    #a notification is already pending
+
+    def wait(self, slot, predicate, timeout=None):
+        """Block until predicate() is true, checking it at every notification of slot
+
+        returns the last value of predicate() (False if the timeout in seconds expired)
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        semaphore = self.__semaphores[slot]
+        while True:
+            value = predicate()
+            if value: return value
+            remaining = None if deadline is None else deadline - time.monotonic()
+            if remaining is not None and remaining <= 0: return value
+            semaphore.acquire(True, remaining)
+
+class SharedRing:
+    """
+        Single producer circular buffer of float64 samples in shared memory
+
+        The header holds a 64 bit write sequence: the total number of samples ever written.
+        The sample with global index k is stored at position k % capacity and is available
+        while sequence - capacity <= k < sequence, so readers can compute exact global indices
+        and detect whether they fell behind (lapped) the producer.
+        As in a seqlock, the header also holds the sequence the write in progress will reach:
+        it is advanced before the samples are written and the sequence after them,
+        so readers discard the samples a write in progress may have overwritten while they were copied.
+        The ring is passed to other processes by name (pickling attaches to the same memory),
+        the memory is released when the ring of the creating process is garbage collected.
+        Readers can block until new samples land with waitFor (or waitUntil) on a slot of the notifier
+        (see RingNotifier), the producer notifies them once for each block written. Rings created with
+        the same notifier share the notification, so a reader can wait for new samples on any of them.
+    """
+    def __init__(self, capacity=1000, notifier=None):
+        self.capacity = capacity
+        self.__notifier = RingNotifier(1) if notifier is None else notifier
+        self.__shm = shared_memory.SharedMemory(create=True, size=16 + 8 * capacity)
+        self.__finalizer = weakref.finalize(self, _releaseSharedMemory, self.__shm, True)
+        self.__map()
+        self.reset()
+
+    def __map(self):
+        self.__sequence = np.ndarray((1,), dtype=np.int64, buffer=self.__shm.buf, offset=0)
+        self.__writing = np.ndarray((1,), dtype=np.int64, buffer=self.__shm.buf, offset=8) #sequence of the write in progress
+        self.__data = np.ndarray((self.capacity,), dtype=np.float64, buffer=self.__shm.buf, offset=16)
+
+    def __getstate__(self):
+        return {"name": self.__shm.name, "capacity": self.capacity, "notifier": self.__notifier}
+
+    def __setstate__(self, state):
+        self.capacity = state["capacity"]
+        self.__notifier = state["notifier"]
+        #child processes share the resource tracker of the creator, only the creator unlinks the memory
+        self.__shm = shared_memory.SharedMemory(name=state["name"])
+        self.__finalizer = weakref.finalize(self, _releaseSharedMemory, self.__shm, False)
+        self.__map()
+
+    def reset(self):
+        """Empty the ring (to be called when no process is reading or writing)"""
+        self.__data[:] = 0
+        self.__sequence[0] = 0
+        self.__writing[0] = 0
+
+    def sequence(self):
+        """Total number of samples written (global index of the next sample)"""
+        return int(self.__sequence[0])
+
+    def position(self):
+        """Position in the buffer of the next sample"""
+        return self.sequence() % self.capacity
+
+    def view(self):
+        """numpy view of the whole buffer (circular order)"""
+        return self.__data
+
+    def append(self, value, notify=True):
+        """Write a single sample (producer only)"""
+        sequence = int(self.__sequence[0])
+        self.__writing[0] = sequence + 1
+        self.__data[sequence % self.capacity] = value
+        self.__sequence[0] = sequence + 1
+        if notify: self.notify()
+
+    def write(self, block, notify=True):
+        """Write a block of samples (producer only), only the newest capacity samples are kept
+
+        with notify=False the readers are not woken up, the producer notifies them once for several blocks
+        """
+        block = np.asarray(block, dtype=np.float64)
+        if block.size == 0: return
+        sequence = int(self.__sequence[0])
+        total = block.size
+        block = block[-self.capacity:]
+        start = (sequence + total - block.size) % self.capacity
+        first = min(block.size, self.capacity - start)
+        self.__writing[0] = sequence + total
+        self.__data[start:start + first] = block[:first]
+        self.__data[:block.size - first] = block[first:]
+        self.__sequence[0] = sequence + total
+        if notify: self.notify()
+
+    def notify(self):
+        """Wake up the readers waiting on the ring (and on the rings sharing its notifier), never blocks
+
+        called by append and write, the producer calls it directly to wake up the readers
+        for other reasons (e.g. the end of the recording)
+        """
+        self.__notifier.notify()
+
+    def waitUntil(self, slot, predicate, timeout=None):
+        """Block until predicate() is true, checking it at every notification of slot (see RingNotifier.subscribe)
+
+        returns the last value of predicate() (False if the timeout in seconds expired)
+        """
+        return self.__notifier.wait(slot, predicate, timeout)
+
+    def waitFor(self, slot, sequence, timeout=None):
+        """Block until more than sequence samples have been written (the sample with global index sequence landed)
+
+        returns False if the timeout in seconds expired first
+        """
+        return self.waitUntil(slot, lambda: self.sequence() > sequence, timeout)
+
+    def read(self, start, end=None):
+        """Copy of the samples with global index in [start, end) (end defaults to the current sequence)
+
+        returns a tuple (first, samples): first is the global index of samples[0],
+        first > start if part of the requested samples has already been overwritten (reader lapped)
+        """
+        sequence = self.sequence()
+        end = sequence if end is None else min(end, sequence)
+        first = max(start, sequence - self.capacity, 0)
+        if first >= end: return end, np.zeros(0, dtype=np.float64)
+        positions = np.arange(first, end) % self.capacity
+        samples = self.__data[positions]
+        #samples overwritten while they were copied are discarded, also by a write still in progress
+        oldest = int(self.__writing[0]) - self.capacity
+        if oldest > first:
+            samples = samples[oldest - first:]
+            first = oldest
+        return first, samples
+
+    def latest(self, n):
+        """Copy of the newest n samples (fewer if less than n were written)"""
+        sequence = self.sequence()
+        return self.read(sequence - n, sequence)[1]
+
+class ControlBlock:
+    """
+        Shared control header of a recording, kept out of the data rings
+
+        It holds the state of the recording (IDLE, RUNNING, STOPPING, STOPPED) and, for each sensor,
+        the sequence of the last sample processed by its analyzer and the number of complete movements
+        (the events themselves are published in the SharedEventLog of the sensor).
+        Each word is a 64 bit integer written by a single process, so it is read with one atomic load.
+        The block is passed to other processes by name like SharedRing.
+    """
+    IDLE = 0
+    RUNNING = 1
+    STOPPING = 2    #the producer has written the last sample, analyzers publish their results and exit
+    STOPPED = 3
+
+    __HEADER = 1
+    __FIELDS = 2    #processed sequence, movements
+
+    def __init__(self, nSensors=2):
+        self.nSensors = nSensors
+        self.__shm = shared_memory.SharedMemory(create=True, size=8 * (self.__HEADER + self.__FIELDS * nSensors))
+        self.__finalizer = weakref.finalize(self, _releaseSharedMemory, self.__shm, True)
+        self.__map()
+        self.reset()
+
+    def __map(self):
+        self.__words = np.ndarray((self.__HEADER + self.__FIELDS * self.nSensors,), dtype=np.int64, buffer=self.__shm.buf)
+
+    def __getstate__(self):
+        return {"name": self.__shm.name, "nSensors": self.nSensors}
+
+    def __setstate__(self, state):
+        self.nSensors = state["nSensors"]
+        self.__shm = shared_memory.SharedMemory(name=state["name"])
+        self.__finalizer = weakref.finalize(self, _releaseSharedMemory, self.__shm, False)
+        self.__map()
+
+    def __field(self, sensor, field):
+        return self.__HEADER + self.__FIELDS * sensor + field
+
+    def reset(self):
+        """IDLE state and no results (to be called when no recording is running)"""
+        self.__words[:] = 0
+
+    def state(self):
+        return int(self.__words[0])
+
+    def setState(self, state):
+        self.__words[0] = state
+
+    def isRunning(self):
+        return self.state() == self.RUNNING
+
+    def processed(self, sensor):
+        """Sequence of the ring of sensor after the last sample processed by its analyzer"""
+        return int(self.__words[self.__field(sensor, 0)])
+
+    def setProcessed(self, sensor, sequence):
+        self.__words[self.__field(sensor, 0)] = sequence
+
+    def movements(self, sensor):
+        """Number of complete movements counted by the analyzer of sensor"""
+        return int(self.__words[self.__field(sensor, 1)])
+
+    def setMovements(self, sensor, movements):
+        self.__words[self.__field(sensor, 1)] = movements
+
+# Layout of an event published by an analyzer
+EVENT_DTYPE = np.dtype([
+    ("sampleIndex", np.int64),  #global index (ring sequence) of the newest sample analyzed when the event was detected
+    ("sampleTime", np.float64), #time of the event on the sample clock (seconds, sample index / sampling frequency)
+    ("wallTime", np.float64),   #time.time() when the event was published
+    ("eventType", np.int32),
+    ("leg", np.int32),          #number of the sensor
+])
+
+def _releaseEventSegments(shm, segments, unlink):
+    for segment in segments:
+        _releaseSharedMemory(segment, unlink)
+    _releaseSharedMemory(shm, unlink)
+
+class SharedEventLog:
+    """
+        Append only log of the events detected by one analyzer (single producer), in shared memory
+
+        Events (see EVENT_DTYPE) are stored in segments of segmentSize events, so the log never fills up.
+        The header holds the number of events published: an event is written
+        before the count is advanced, so readers in other processes can follow the log while it is written.
+        Segments are named after the header and are only allocated by the process creating the log,
+        which keeps them open until the log is released (on Windows a shared memory block is freed with its last handle):
+        it preallocates `segments` of them and allocates the next ones ahead of the writer with reserve().
+        The writer and the readers attach the segments by name on their own.
+        The log is passed to other processes by name, the process creating it releases all the segments.
+    """
+    MOVEMENT = 1        #complete movement (step), the interesting points of the recording
+    LEG_DETECTED = 2    #the leg of the sensor has been automatically detected as the step leg
+
+    def __init__(self, segmentSize=1024, segments=2):
+        self.segmentSize = segmentSize
+        self.__shm = shared_memory.SharedMemory(create=True, size=8)
+        self.__owner = os.getpid() #forked processes inherit the log without unpickling it
+        self.__segments = []
+        self.__finalizer = weakref.finalize(self, _releaseEventSegments, self.__shm, self.__segments, True)
+        self.__map()
+        for _ in range(segments): self.__attach(create=True)
+        self.reset()
+
+    def __map(self):
+        self.__count = np.ndarray((1,), dtype=np.int64, buffer=self.__shm.buf)
+        self.__views = []
+        self.__lock = Lock() #the owner can allocate while a writer thread of the same process attaches
+
+    def __getstate__(self):
+        return {"name": self.__shm.name, "segmentSize": self.segmentSize}
+
+    def __setstate__(self, state):
+        self.segmentSize = state["segmentSize"]
+        self.__shm = shared_memory.SharedMemory(name=state["name"])
+        self.__owner = None
+        self.__segments = []
+        self.__finalizer = weakref.finalize(self, _releaseEventSegments, self.__shm, self.__segments, False)
+        self.__map()
+
+    def __attach(self, create=False):
+        """Attach the next segment (allocate it if create), returns False if it does not exist"""
+        name = "{}_s{:d}".format(self.__shm.name, len(self.__views))
+        try:
+            if create: segment = shared_memory.SharedMemory(name=name, create=True, size=EVENT_DTYPE.itemsize * self.segmentSize)
+            else: segment = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            return False
+        self.__segments.append(segment)
+        self.__views.append(np.ndarray((self.segmentSize,), dtype=EVENT_DTYPE, buffer=segment.buf))
+        return True
+
+    def __segment(self, k):
+        """numpy view of segment k (attached on first use, None if it has not been allocated)"""
+        if k < len(self.__views): return self.__views[k]
+        with self.__lock:
+            while len(self.__views) <= k:
+                if not self.__attach(create=self.__owner == os.getpid()): return None
+        return self.__views[k]
+
+    def reserve(self, spare=1):
+        """
+        Allocate the segments ahead of the writer (owner only, to be called periodically while the log is written).
+
+        Effects:
+            At least spare segments are allocated after the one holding the next event.
+        """
+        if self.__owner != os.getpid(): raise RuntimeError("only the process creating the log can allocate its segments")
+        needed = int(self.__count[0]) // self.segmentSize + 1 + spare
+        if len(self.__views) < needed: self.__segment(needed - 1)
+
+    def reset(self):
+        """Empty the log, the segments are kept (to be called when no process is reading or writing)"""
+        self.__count[0] = 0
+
+    def count(self):
+        """Number of events published"""
+        return int(self.__count[0])
+
+    def __len__(self):
+        return self.count()
+
+    def append(self, sampleIndex, sampleTime, wallTime, eventType, leg):
+        """
+        Publish an event (producer only)
+
+        Effects:
+            Returns: bool False if the event has been dropped, since its segment has not been allocated by the owner (see reserve).
+        """
+        count = int(self.__count[0])
+        segment = self.__segment(count // self.segmentSize)
+        if segment is None: return False
+        segment[count % self.segmentSize] = (sampleIndex, sampleTime, wallTime, eventType, leg)
+        self.__count[0] = count + 1
+        return True
+
+    def read(self, start=0, end=None):
+        """Copy of the events with index in [start, end) (end defaults to the number of events published)
+        as a structured numpy.array (see EVENT_DTYPE)"""
+        count = self.count()
+        end = count if end is None else min(end, count)
+        if start >= end: return np.zeros(0, dtype=EVENT_DTYPE)
+        blocks = []
+        for k in range(start // self.segmentSize, (end - 1) // self.segmentSize + 1):
+            offset = k * self.segmentSize
+            blocks.append(self.__segment(k)[max(start - offset, 0):min(end - offset, self.segmentSize)])
+        return np.concatenate(blocks)
+
+    def events(self, eventType=None):
+        """All the events published (only those of eventType if given)"""
+        events = self.read()
+        return events if eventType is None else events[events["eventType"] == eventType]
+
+class SharedData:
+    """
+        Shared circular buffers of the pitch data, one ring for each sensor (see SharedRing),
+        the logs of the events detected by the analyzers, one for each sensor (see SharedEventLog),
+        and the control block of the recording (see ControlBlock)
+        The rings share one notifier with a slot for each sensor (at most one reader for each sensor),
+        waiting on any of them wakes up when a sample lands on one of them.
+    """
+    def __init__(self, nSensors=2, capacity=1000):
+        self.nSensors = nSensors
+        self.notifier = RingNotifier(nSensors)
+        self.rings = [SharedRing(capacity, self.notifier) for _ in range(nSensors)]
+        self.events = [SharedEventLog() for _ in range(nSensors)]
+        self.control = ControlBlock(nSensors)
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the modules of sonicwalk import each other by name (as when the package directory is on the path)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sonicwalk"))
@@ -0,0 +1,98 @@
+# Regression tests of the detection: the batch analysis of a recording (batch.py) has its own vectorized
+# implementation of the detectors, it must give the same events as the streaming detectors (detectors.py)
+# fed one sample at a time, as the analyzers are during a recording.
+# The incremental building blocks of the detectors are checked against the numpy implementations they replace.
+
+import glob
+import os
+from functools import lru_cache
+
+import numpy as np
+import pytest
+
+from batch import analyzeRecording
+from detectors import (Detector, SlidingExtrema, ZeroCrossingTracker, zeroCrossingDetector, CausalSmoother,
+                       LegCoordinator, createDetector, SMOOTHING_KERNEL)
+from sensitivity import sensitivityLevel
+from sensorRecords import readRecording
+
+ARCHIVE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "GUI", "data", "archive")
+RECORDINGS = sorted(glob.glob(os.path.join(ARCHIVE, "*", "*", "*.csv")))
+# (selectedLeg, auto_detectLegs): first sensor on the step leg, on the other leg, legs detected automatically
+LEG_MODES = [(True, False), (False, False), (None, True)]
+
+@lru_cache(maxsize=None)
+def recording(path):
+    return readRecording(path)
+
+def stream(signals, Fs, exType, sensitivity, selectedLeg, auto_detectLegs):
+    """Events of the streaming detectors fed one sample at a time, the sensors interleaved (as recorder.mtwRecord)"""
+    coordinator = LegCoordinator() if auto_detectLegs else None
+    parameters = sensitivityLevel(sensitivity)
+    detectors = []
+    for i in range(signals.shape[0]):
+        leg = selectedLeg if i % 2 == 0 or selectedLeg is None else not selectedLeg
+        detectors.append(createDetector(exType, parameters, selectedLeg=leg, coordinator=coordinator))
+    events = [[] for _ in detectors]
+    times = np.arange(signals.shape[1]) / Fs
+    for k in range(signals.shape[1]):
+        for i, detector in enumerate(detectors):
+            events[i] += detector.feed(signals[i, k:k + 1], times[k:k + 1])
+    return events
+
+def test_archive():
+    assert RECORDINGS, "no recordings in " + ARCHIVE
+
+@pytest.mark.parametrize("selectedLeg, auto_detectLegs", LEG_MODES)
+@pytest.mark.parametrize("sensitivity", range(1, 6))
+@pytest.mark.parametrize("exType", range(5))
+@pytest.mark.parametrize("path", RECORDINGS, ids=os.path.basename)
+def test_batch_matches_streaming(path, exType, sensitivity, selectedLeg, auto_detectLegs):
+    signals, Fs = recording(path)
+    expected = stream(signals, Fs, exType, sensitivity, selectedLeg, auto_detectLegs)
+    assert analyzeRecording(signals, Fs, exType, sensitivity, selectedLeg, auto_detectLegs) == expected
+
+@pytest.mark.parametrize("path", RECORDINGS, ids=os.path.basename)
+def test_sliding_extrema(path):
+    signals, Fs = recording(path)
+    size = Detector.WINSIZE
+    for signal in signals:
+        extrema = SlidingExtrema(size)
+        for k, value in enumerate(signal.tolist()):
+            extrema.push(value)
+            window = signal[max(0, k - size + 1):k + 1]
+            assert (extrema.max(), extrema.min()) == (np.max(window), np.min(window))
+
+@pytest.mark.parametrize("sign", [1.0, -1.0])
+@pytest.mark.parametrize("displacement", [-10.0, -3.3, 0.0, -0.0, 5.0])
+@pytest.mark.parametrize("path", RECORDINGS, ids=os.path.basename)
+def test_zero_crossing_tracker(path, displacement, sign):
+    signals, Fs = recording(path)
+    size = Detector.WINSIZE
+    for signal in signals:
+        tracker = ZeroCrossingTracker(size, displacement, sign)
+        for k, value in enumerate(signal.tolist()):
+            if k % 500 == 499:
+                # the shift changes while the window is full (as the thresholds of the swing detector)
+                displacement = -displacement
+                tracker.shift(displacement, sign)
+            tracker.push(value)
+            if k < size - 1: continue
+            window = sign * signal[k - size + 1:k + 1] + displacement
+            for positive, maxAbsGradient in ((True, None), (False, None), (True, 1.0)):
+                expected = zeroCrossingDetector(window, positive, maxAbsGradient)
+                result = tracker.detect(positive, maxAbsGradient)
+                if expected is None:
+                    assert result is None
+                else:
+                    assert result is not None
+                    assert (result.founded, result.gradient) == (bool(expected.founded), float(expected.gradient))
+
+@pytest.mark.parametrize("kernel", [SMOOTHING_KERNEL, (1.0,), (0.5, 0.3, 0.2)])
+@pytest.mark.parametrize("path", RECORDINGS, ids=os.path.basename)
+def test_causal_smoother(path, kernel):
+    signals, Fs = recording(path)
+    for signal in signals:
+        smoother = CausalSmoother(kernel)
+        live = np.array([smoother.push(value) for value in signal.tolist()])
+        assert np.array_equal(live, CausalSmoother(kernel).apply(signal))
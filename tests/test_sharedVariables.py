@@ -0,0 +1,50 @@
+# Tests of the shared memory ring of the samples (sharedVariables.SharedRing):
+# readers lapped by the producer must skip the overwritten samples, never return them.
+
+import numpy as np
+import pytest
+
+from sharedVariables import SharedRing
+
+class Stalled(Exception):
+    pass
+
+class StallingBuffer(np.ndarray):
+    """Buffer of the ring of a producer that stops after storing the samples, before publishing the write"""
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        raise Stalled()
+
+def test_reader_lapped():
+    ring = SharedRing(capacity=100)
+    ring.write(np.arange(250, dtype=np.float64))
+    first, samples = ring.read(0)
+    assert first == 150
+    assert np.array_equal(samples, np.arange(150, 250))
+
+def test_reader_lapped_samples():
+    ring = SharedRing(capacity=100)
+    cursor, lost = 0, 0
+    for value in range(1000):
+        ring.append(value)
+        if value % 130 == 129:  #the reader falls behind by more than the capacity of the ring
+            first, samples = ring.read(cursor)
+            assert first >= cursor
+            assert np.array_equal(samples, np.arange(first, first + samples.size))
+            lost += first - cursor
+            cursor = first + samples.size
+    assert lost > 0
+
+def test_reader_lapped_by_write_in_progress():
+    ring = SharedRing(capacity=100)
+    ring.write(np.arange(100, dtype=np.float64))
+    buffer = ring._SharedRing__data
+    ring._SharedRing__data = buffer.view(StallingBuffer)
+    with pytest.raises(Stalled):
+        ring.write(np.arange(100, 110, dtype=np.float64))
+    ring._SharedRing__data = buffer
+    assert ring.sequence() == 100    #the write has not been published
+    first, samples = ring.read(0)
+    #the samples with global index 0 to 9 have been overwritten by the write in progress
+    assert first == 10
+    assert np.array_equal(samples, np.arange(10, 100))